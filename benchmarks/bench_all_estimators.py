@@ -4,49 +4,65 @@
 #
 # Author: Pierre Glaser
 from benchmarks.common import SklearnBenchmark
-from benchmarks.common import ALL_REGRESSORS
+from benchmarks.common import ALL_CLASSIFIERS, ALL_REGRESSORS
+from benchmarks.common import ALL_TRANSFORMERS
 from benchmarks.common import clone_and_fit
+from benchmarks.common import make_estimator_dataset, scheduled_estimators
+from benchmarks.common import with_gil_profiling, with_memory_tracking
 
-from benchmarks.config import N_SAMPLES
+from benchmarks.config import DEFAULT_N_SAMPLES
+from benchmarks.config import N_SAMPLES, N_SAMPLES_CLASSIFIERS
+from benchmarks.config import N_SAMPLES_TRANSFORMERS, REPEAT
 
 
-class RegressionBench(SklearnBenchmark):
+BACKENDS = ['multiprocessing', 'loky', 'threading'][1:]
+PICKLERS = ['pickle', 'cloudpickle']
+N_JOBS = [1, 2, 4]
+
+# number of fits run for each estimator. For each parameter combination, the
+# time_* methods fit 1 (single fit) and n_tasks (multiple fits) estimators,
+# REPEAT times each. Both memory tracking methods run them again, and so do
+# the GIL profiling methods with the threading backend
+N_FITS_PER_RUN = 1 + SklearnBenchmark.n_tasks
+N_FITS_PER_ESTIMATOR = N_FITS_PER_RUN * len(PICKLERS) * len(N_JOBS) * (
+    len(BACKENDS) * (REPEAT + 2) + BACKENDS.count('threading'))
+
+
+(SCHEDULED_REGRESSORS, SCHEDULED_CLASSIFIERS,
+ SCHEDULED_TRANSFORMERS) = scheduled_estimators(N_FITS_PER_ESTIMATOR)
+
+
+class _EstimatorBench(SklearnBenchmark):
+    # subclasses define the estimators to benchmark, their default number of
+    # samples, and the sklearn.datasets generator used to create the data
+    estimators = None
+    n_samples_table = None
+    generator = None
+
     param_names = ['estimator_name', 'backend', 'pickler', 'n_jobs',
                    'n_samples', 'n_features']
-    params = (sorted(list(ALL_REGRESSORS.keys()))[:5],
-              ['multiprocessing', 'loky', 'threading'][1:],
-              ['pickle', 'cloudpickle'],
-              [1, 2, 4],
-              ['auto'],
-              ['auto'])
 
     def setup(self, estimator_name, backend, pickler, n_jobs, n_samples,
               n_features):
-        super(RegressionBench, self).setup(backend, pickler)
-        from sklearn.datasets import make_regression
+        super(_EstimatorBench, self).setup(backend, pickler)
 
         if n_samples == 'auto':
-            n_samples = N_SAMPLES[estimator_name]
+            n_samples = self.n_samples_table.get(estimator_name,
+                                                 DEFAULT_N_SAMPLES)
 
         if n_features == 'auto':
             n_features = 10
 
-        # For multitask estimators, generate multi-dimensional output
-        if 'MultiTask' in estimator_name:
-            X, y = make_regression(n_samples, n_features, n_targets=4)
-        else:
-            X, y = make_regression(n_samples, n_features, n_targets=1)
-
-        X, y = make_regression(n_samples, n_features)
+        X, y = make_estimator_dataset(estimator_name, self.generator,
+                                      n_samples, n_features)
         self.X = X
-        assert self.X.shape[0] == N_SAMPLES[estimator_name]
         self.y = y
 
     def time_single_fit_parallelization(self, estimator_name, backend, pickler,
                                         n_jobs, n_samples, n_features):
-        # ALL_REGRESSORS is a dict. The keys are the estimator class names, and
-        # the values are the estimator classes
-        cls = ALL_REGRESSORS[estimator_name]
+        # self.estimators is a dict. The keys are the estimator class names,
+        # and the values are the estimator classes
+        cls = self.estimators[estimator_name]
         estimator = cls()
         if 'n_jobs' in estimator.get_params():
             estimator.set_params(n_jobs=n_jobs)
@@ -61,7 +77,7 @@ class RegressionBench(SklearnBenchmark):
     def time_multiple_fit_parallelization(self, estimator_name, backend,
                                           pickler, n_jobs, n_samples,
                                           n_features):
-        cls = ALL_REGRESSORS[estimator_name]
+        cls = self.estimators[estimator_name]
         estimator = cls()
         from joblib import Parallel, delayed
         if 'n_jobs' in estimator.get_params():
@@ -70,3 +86,37 @@ class RegressionBench(SklearnBenchmark):
 
         Parallel(backend=backend, n_jobs=n_jobs)(delayed(clone_and_fit)(
             estimator, self.X, self.y) for _ in range(self.n_tasks))
+
+
+@with_gil_profiling
+@with_memory_tracking
+class RegressionBench(_EstimatorBench):
+    estimators = ALL_REGRESSORS
+    n_samples_table = N_SAMPLES
+    generator = 'make_regression'
+
+    params = (SCHEDULED_REGRESSORS, BACKENDS, PICKLERS, N_JOBS, ['auto'],
+              ['auto'])
+
+
+@with_gil_profiling
+@with_memory_tracking
+class ClassificationBench(_EstimatorBench):
+    estimators = ALL_CLASSIFIERS
+    n_samples_table = N_SAMPLES_CLASSIFIERS
+    generator = 'make_classification'
+
+    params = (SCHEDULED_CLASSIFIERS, BACKENDS, PICKLERS, N_JOBS, ['auto'],
+              ['auto'])
+
+
+@with_gil_profiling
+@with_memory_tracking
+class TransformerBench(_EstimatorBench):
+    estimators = ALL_TRANSFORMERS
+    n_samples_table = N_SAMPLES_TRANSFORMERS
+    # supervised transformers (feature selectors, LDA) need class labels
+    generator = 'make_classification'
+
+    params = (SCHEDULED_TRANSFORMERS, BACKENDS, PICKLERS, N_JOBS, ['auto'],
+              ['auto'])
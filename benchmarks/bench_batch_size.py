@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Benchmark of joblib's task batching on workloads made of many tiny tasks
+#
+# Author: Pierre Glaser
+import timeit
+
+from benchmarks.common import BatchSizeRecorder, SklearnBenchmark
+from benchmarks.common import clone_and_fit, make_cached_dataset
+
+
+def _fit_ridge_fold(X, y, alpha, train, test):
+    from sklearn.linear_model import Ridge
+    return Ridge(alpha=alpha).fit(X[train], y[train]).score(X[test], y[test])
+
+
+class BatchSizeBench(SklearnBenchmark):
+    """Throughput of tiny tasks for several batch_size and pre_dispatch values
+
+    The ridge_gridsearch workload runs the tasks of the GridSearchCV of
+    MakeRegressionDataBench.time_ridge_gridsearch (39 alphas x 50 folds)
+    directly through Parallel, as GridSearchCV does not expose batch_size.
+    The clone_and_fit workload fits many Ridge clones on a small dataset.
+    With batch_size='auto', track_time_to_max_batch_size reports how long
+    joblib takes to grow its batches to their largest size.
+    """
+    param_names = ['backend', 'pickler', 'n_jobs', 'workload', 'batch_size',
+                   'pre_dispatch']
+    params = (['multiprocessing', 'loky', 'threading'][1:],
+              ['pickle', 'cloudpickle'],
+              [2, 4],
+              ['ridge_gridsearch', 'clone_and_fit'],
+              [1, 'auto', 8, 64],
+              ['n_jobs', '2*n_jobs', 'all'])
+
+    def setup(self, backend, pickler, n_jobs, workload, batch_size,
+              pre_dispatch):
+        super(BatchSizeBench, self).setup(backend, pickler)
+        from joblib import delayed
+
+        if workload == 'ridge_gridsearch':
+            from sklearn.model_selection import KFold
+
+            X, y = make_cached_dataset('make_regression', 10000, 10)
+            alphas = [2**-i for i in range(1, 40)]
+            folds = list(KFold(n_splits=50).split(X))
+            self.tasks = [delayed(_fit_ridge_fold)(X, y, alpha, train, test)
+                          for alpha in alphas for train, test in folds]
+        else:
+            from sklearn.linear_model import Ridge
+
+            X, y = make_cached_dataset('make_regression', 1000, 10)
+            self.tasks = [delayed(clone_and_fit)(Ridge(), X, y)
+                          for _ in range(1000)]
+
+    def _run(self, backend, n_jobs, batch_size, pre_dispatch):
+        from joblib import Parallel
+        Parallel(backend=backend, n_jobs=n_jobs, batch_size=batch_size,
+                 pre_dispatch=pre_dispatch)(self.tasks)
+
+    def time_tiny_tasks(self, backend, pickler, n_jobs, workload, batch_size,
+                        pre_dispatch):
+        self._run(backend, n_jobs, batch_size, pre_dispatch)
+
+    def track_throughput(self, backend, pickler, n_jobs, workload,
+                         batch_size, pre_dispatch):
+        t0 = timeit.default_timer()
+        self._run(backend, n_jobs, batch_size, pre_dispatch)
+        return len(self.tasks) / (timeit.default_timer() - t0)
+    track_throughput.unit = 'tasks/second'
+
+    def _record_batches(self, backend, n_jobs, batch_size, pre_dispatch):
+        with BatchSizeRecorder() as recorder:
+            self._run(backend, n_jobs, batch_size, pre_dispatch)
+        return recorder
+
+    def _record_batch_sizes(self, backend, n_jobs, batch_size,
+                            pre_dispatch):
+        return self._record_batches(backend, n_jobs, batch_size,
+                                    pre_dispatch).batch_sizes
+
+    def track_mean_batch_size(self, backend, pickler, n_jobs, workload,
+                              batch_size, pre_dispatch):
+        batch_sizes = self._record_batch_sizes(backend, n_jobs, batch_size,
+                                               pre_dispatch)
+        return sum(batch_sizes) / len(batch_sizes)
+    track_mean_batch_size.unit = 'tasks'
+
+    def track_n_batches(self, backend, pickler, n_jobs, workload, batch_size,
+                        pre_dispatch):
+        return len(self._record_batch_sizes(backend, n_jobs, batch_size,
+                                            pre_dispatch))
+    track_n_batches.unit = 'batches'
+
+    def track_max_batch_size(self, backend, pickler, n_jobs, workload,
+                             batch_size, pre_dispatch):
+        return max(self._record_batch_sizes(backend, n_jobs, batch_size,
+                                            pre_dispatch))
+    track_max_batch_size.unit = 'tasks'
+
+    def track_time_to_max_batch_size(self, backend, pickler, n_jobs,
+                                     workload, batch_size, pre_dispatch):
+        # the first dispatch of a batch of the largest size, rather than the
+        # last change of size: the last batches are smaller, as they only
+        # hold the remaining tasks
+        history = self._record_batches(backend, n_jobs, batch_size,
+                                       pre_dispatch).history
+        max_size = max(size for _, size in history)
+        return min(time for time, size in history if size == max_size)
+    track_time_to_max_batch_size.unit = 'seconds'
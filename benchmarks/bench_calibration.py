@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Calibration of the machine running the benchmarks
+#
+# Author: Pierre Glaser
+import timeit
+
+import numpy as np
+
+from benchmarks.common import calibration_kernel, machine_fingerprint
+from benchmarks.common import measure_memory_bandwidth, write_fingerprint
+from benchmarks.config import REPEAT, WARMUP_TIME
+
+
+class CalibrationBench:
+    """Reference workload timed on every machine and commit
+
+    setup records the hardware and software fingerprint of the run, along
+    with the memory bandwidth of the machine (see write_fingerprint).
+    sum_up_results.create_benchmark_dataframe(normalize=True) divides the
+    timings of the other benchmarks by the one of time_calibration_kernel
+    obtained in the same run, so that hosts of different speeds can be
+    compared.
+    """
+    processes = 1
+    number = 1
+    repeat = REPEAT
+    warmup_time = WARMUP_TIME
+    timer = timeit.default_timer
+    timeout = 120
+
+    # non-asv class attribute: orchestrate.py runs this benchmark alone, as
+    # concurrent cases would share the memory bandwidth
+    exclusive = True
+
+    def setup(self):
+        self.memory_bandwidth = measure_memory_bandwidth()
+        fingerprint = machine_fingerprint()
+        fingerprint['memory_bandwidth'] = self.memory_bandwidth
+        write_fingerprint(fingerprint)
+
+        self.src = np.ones(2 ** 25)
+        self.dst = np.empty_like(self.src)
+
+    def time_calibration_kernel(self):
+        calibration_kernel(self.src, self.dst)
+
+    def track_memory_bandwidth(self):
+        return self.memory_bandwidth / 1e9
+    track_memory_bandwidth.unit = 'GB/s'
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Benchmark of the dask.distributed joblib backend on a local cluster
+#
+# Author: Pierre Glaser
+from benchmarks.common import EstimatorWithLargeList, SklearnBenchmark
+from benchmarks.common import load_20newsgroups, load_california_housing
+from benchmarks.common import make_cached_dataset
+
+
+def _run_workload(workload, X, y, n_jobs):
+    # the workloads of bench_parallel_sklearn.py, run in the active backend
+    from sklearn.model_selection import GridSearchCV, ShuffleSplit
+    from sklearn.model_selection import cross_val_score
+    from sklearn.pipeline import Pipeline
+
+    if workload == 'gridsearch_large_list':
+        params = {'alpha': [1, 0.1, 0.001]}
+        GridSearchCV(EstimatorWithLargeList(), params, cv=4,
+                     n_jobs=n_jobs).fit(X, y)
+    elif workload == 'ridge_gridsearch':
+        from sklearn.linear_model import Ridge
+        params = {'alpha': [2**-i for i in range(1, 40)]}
+        GridSearchCV(Ridge(), params, cv=50, n_jobs=n_jobs).fit(X, y)
+    elif workload == 'randomforest':
+        from sklearn.ensemble import RandomForestRegressor
+        RandomForestRegressor(n_estimators=100, n_jobs=n_jobs).fit(X, y)
+    elif workload == 'text_vectorizer':
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import SGDClassifier
+        pipeline = Pipeline([('tfidf', TfidfVectorizer()),
+                             ('clf', SGDClassifier())])
+        cv = ShuffleSplit(n_splits=4, test_size=0.33)
+        cross_val_score(pipeline, X, y, cv=cv, n_jobs=n_jobs)
+    elif workload == 'kbins_polynomial_pipeline':
+        from sklearn.linear_model import Ridge
+        from sklearn.preprocessing import KBinsDiscretizer, PolynomialFeatures
+        pipeline = Pipeline([
+            ('discretizer', KBinsDiscretizer(encode='onehot')),
+            ('polynomial_features', PolynomialFeatures()),
+            ('estimator', Ridge())])
+        cv = ShuffleSplit(n_splits=4, test_size=0.3)
+        cross_val_score(pipeline, X, y, cv=cv, n_jobs=n_jobs)
+    else:
+        raise ValueError('unknown workload: {}'.format(workload))
+
+
+def _load_workload_data(workload):
+    if workload == 'text_vectorizer':
+        return load_20newsgroups()
+    elif workload == 'kbins_polynomial_pipeline':
+        return load_california_housing()
+    return make_cached_dataset('make_regression', 10000, 10)
+
+
+class DistributedBench(SklearnBenchmark):
+    """The pipelines of bench_parallel_sklearn.py on a dask LocalCluster
+
+    The loky backend is run as a single-node baseline, with n_workers
+    processes. With scatter=True, X and y are broadcast to the dask workers in
+    setup, so that the timings only include the shipping of the tasks. The
+    cost of the broadcast itself is timed by time_scatter, on workers which
+    do not hold the data yet (scatter=False).
+    """
+    param_names = ['backend', 'workload', 'n_workers', 'threads_per_worker',
+                   'scatter']
+    params = (['dask', 'loky'],
+              ['gridsearch_large_list', 'ridge_gridsearch', 'randomforest',
+               'text_vectorizer', 'kbins_polynomial_pipeline'],
+              [1, 2, 4],
+              [1, 2],
+              [False, True])
+    timeout = 600
+
+    def setup(self, backend, workload, n_workers, threads_per_worker,
+              scatter):
+        if backend == 'loky' and (threads_per_worker != 1 or scatter):
+            # these parameters only apply to dask
+            raise NotImplementedError
+        super(DistributedBench, self).setup(backend, 'cloudpickle')
+
+        self.X, self.y = _load_workload_data(workload)
+        self.cluster = self.client = None
+        if backend == 'dask':
+            from distributed import Client, LocalCluster
+            self.cluster = LocalCluster(n_workers=n_workers,
+                                        threads_per_worker=threads_per_worker,
+                                        processes=True)
+            self.client = Client(self.cluster)
+            # the dask backend scatters the data when it is created. It is
+            # only activated in time_workload: parallel_backend activates the
+            # backend it is given as soon as it is called
+            from joblib._dask import DaskDistributedBackend
+            self.backend = DaskDistributedBackend(
+                scatter=[self.X, self.y] if scatter else None)
+            self.n_jobs = -1
+        else:
+            self.backend = 'loky'
+            self.n_jobs = n_workers
+
+    def teardown(self, backend, workload, n_workers, threads_per_worker,
+                 scatter):
+        if self.client is not None:
+            self.client.close()
+            self.cluster.close()
+        super(DistributedBench, self).teardown(
+            backend, workload, n_workers, threads_per_worker, scatter)
+
+    def time_workload(self, backend, workload, n_workers, threads_per_worker,
+                      scatter):
+        from joblib import parallel_backend
+        with parallel_backend(self.backend):
+            _run_workload(workload, self.X, self.y, self.n_jobs)
+
+    def time_scatter(self, backend, workload, n_workers, threads_per_worker,
+                     scatter):
+        # hash=False: new keys, so that the data is sent even if the workers
+        # already hold it
+        self.client.scatter([self.X, self.y], broadcast=True, hash=False)
+
+    time_scatter.param_names = param_names
+    time_scatter.params = (['dask'], params[1], params[2], params[3], [False])
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Benchmark of the dtype and memory layout of the input data
+#
+# Author: Pierre Glaser
+from benchmarks.common import SklearnBenchmark
+from benchmarks.common import ALL_CLASSIFIERS, ALL_REGRESSORS
+from benchmarks.common import clone_and_fit, clone_and_fit_tracking_copies
+from benchmarks.common import make_estimator_dataset, scheduled_estimators
+
+from benchmarks.config import DEFAULT_N_SAMPLES
+from benchmarks.config import N_SAMPLES, N_SAMPLES_CLASSIFIERS, REPEAT
+
+
+BACKENDS = ['multiprocessing', 'loky', 'threading'][1:]
+PICKLERS = ['pickle', 'cloudpickle']
+N_JOBS = [1, 2, 4]
+DTYPES = ['float32', 'float64']
+ORDERS = ['C', 'F']
+
+# for each parameter combination, the time_* method (REPEAT times) and both
+# track_* methods fit n_tasks estimators
+N_FITS_PER_ESTIMATOR = (len(BACKENDS) * len(PICKLERS) * len(N_JOBS) *
+                        len(DTYPES) * len(ORDERS) * (REPEAT + 2) *
+                        SklearnBenchmark.n_tasks)
+
+SCHEDULED_REGRESSORS, SCHEDULED_CLASSIFIERS, _ = scheduled_estimators(
+    N_FITS_PER_ESTIMATOR)
+
+ESTIMATORS = dict(
+    [(name, (ALL_REGRESSORS[name], 'make_regression', N_SAMPLES))
+     for name in SCHEDULED_REGRESSORS] +
+    [(name, (ALL_CLASSIFIERS[name], 'make_classification',
+             N_SAMPLES_CLASSIFIERS))
+     for name in SCHEDULED_CLASSIFIERS])
+
+
+class DtypeLayoutBench(SklearnBenchmark):
+    """Fitting estimators on float32/float64, C/Fortran-ordered data
+
+    Estimators that do not support the dtype or layout of their input make a
+    copy of it when validating it, in every worker. Besides the time, the
+    number and size of these copies per fit are tracked.
+    """
+    param_names = ['estimator_name', 'backend', 'pickler', 'n_jobs', 'dtype',
+                   'order']
+    params = (sorted(ESTIMATORS), BACKENDS, PICKLERS, N_JOBS, DTYPES, ORDERS)
+
+    def setup(self, estimator_name, backend, pickler, n_jobs, dtype, order):
+        super(DtypeLayoutBench, self).setup(backend, pickler)
+        cls, generator, n_samples_table = ESTIMATORS[estimator_name]
+        n_samples = n_samples_table.get(estimator_name, DEFAULT_N_SAMPLES)
+
+        X, y = make_estimator_dataset(estimator_name, generator, n_samples,
+                                      10, dtype=dtype, order=order)
+        self.X = X
+        self.y = y
+
+        self.estimator = cls()
+        if 'n_jobs' in self.estimator.get_params():
+            # avoid over subscription
+            self.estimator.set_params(n_jobs=1)
+
+    def time_multiple_fit(self, estimator_name, backend, pickler, n_jobs,
+                          dtype, order):
+        from joblib import Parallel, delayed
+        Parallel(backend=backend, n_jobs=n_jobs)(delayed(clone_and_fit)(
+            self.estimator, self.X, self.y) for _ in range(self.n_tasks))
+
+    def _copies(self, backend, n_jobs):
+        from joblib import Parallel, delayed
+        return Parallel(backend=backend, n_jobs=n_jobs)(
+            delayed(clone_and_fit_tracking_copies)(
+                self.estimator, self.X, self.y) for _ in range(self.n_tasks))
+
+    def track_n_copies_per_fit(self, estimator_name, backend, pickler,
+                               n_jobs, dtype, order):
+        copies = self._copies(backend, n_jobs)
+        return sum(n_copies for n_copies, _ in copies) / len(copies)
+    track_n_copies_per_fit.unit = 'copies'
+
+    def track_copied_bytes_per_fit(self, estimator_name, backend, pickler,
+                                   n_jobs, dtype, order):
+        copies = self._copies(backend, n_jobs)
+        return sum(nbytes for _, nbytes in copies) / len(copies)
+    track_copied_bytes_per_fit.unit = 'bytes'
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Benchmark of batch inference (predict) of scikit-learn estimators
+#
+# Author: Pierre Glaser
+import timeit
+
+import numpy as np
+
+from benchmarks.common import SklearnBenchmark
+from benchmarks.common import ALL_CLASSIFIERS, ALL_REGRESSORS
+from benchmarks.common import cached_fitted_estimator, make_estimator_dataset
+from benchmarks.common import scheduled_estimators
+
+from benchmarks.config import DEFAULT_N_SAMPLES
+from benchmarks.config import N_SAMPLES, N_SAMPLES_CLASSIFIERS, REPEAT
+
+
+BACKENDS = ['multiprocessing', 'loky', 'threading'][1:]
+PICKLERS = ['pickle', 'cloudpickle']
+N_JOBS = [1, 2, 4]
+CHUNK_SIZES = [1000, 10000]
+BATCH_SIZES = [1, 10, 100]
+
+N_PREDICT_SAMPLES = 100000
+N_LATENCY_CALLS = 200
+
+# number of rows predicted for each estimator: for each parameter combination,
+# the throughput benchmark predicts N_PREDICT_SAMPLES rows REPEAT times and
+# once more for its track_* method, and both latency metrics predict
+# N_LATENCY_CALLS batches (plus one warm-up row per worker)
+N_PREDICTED_ROWS = len(BACKENDS) * len(PICKLERS) * len(N_JOBS) * (
+    len(CHUNK_SIZES) * (REPEAT + 1) * N_PREDICT_SAMPLES +
+    2 * sum(N_LATENCY_CALLS * batch_size for batch_size in BATCH_SIZES))
+
+
+def n_fits_per_estimator(name):
+    # estimators are fitted once and cached. The cost of predicting is not
+    # cheaper than a fit for all of them (neighbors and kernel methods scan
+    # their training set for each row): count predicting as many rows as the
+    # training set as one fit
+    n_samples = N_SAMPLES.get(
+        name, N_SAMPLES_CLASSIFIERS.get(name, DEFAULT_N_SAMPLES))
+    return 1 + N_PREDICTED_ROWS / n_samples
+
+
+SCHEDULED_REGRESSORS, SCHEDULED_CLASSIFIERS, _ = scheduled_estimators(
+    n_fits_per_estimator)
+
+ESTIMATORS = dict(
+    [(name, (ALL_REGRESSORS[name], 'make_regression', N_SAMPLES))
+     for name in SCHEDULED_REGRESSORS] +
+    [(name, (ALL_CLASSIFIERS[name], 'make_classification',
+             N_SAMPLES_CLASSIFIERS))
+     for name in SCHEDULED_CLASSIFIERS])
+
+
+class _InferenceBench(SklearnBenchmark):
+    # fits the estimator in setup (once, thanks to the cache), and generates
+    # the data to predict on
+    n_predict_samples = N_PREDICT_SAMPLES
+    n_features = 10
+
+    def setup(self, estimator_name, backend, pickler, *params):
+        super(_InferenceBench, self).setup(backend, pickler)
+        cls, generator, n_samples_table = ESTIMATORS[estimator_name]
+        n_samples = n_samples_table.get(estimator_name, DEFAULT_N_SAMPLES)
+
+        X, y = make_estimator_dataset(estimator_name, generator, n_samples,
+                                      self.n_features)
+        estimator = cls()
+        if 'n_jobs' in estimator.get_params():
+            # parallelism comes from the chunking of the predictions
+            estimator.set_params(n_jobs=1)
+        self.estimator = cached_fitted_estimator(
+            estimator, X, y, dict(estimator_name=estimator_name,
+                                  generator=generator, n_samples=n_samples,
+                                  n_features=self.n_features))
+
+        self.X_predict, _ = make_estimator_dataset(
+            estimator_name, generator, self.n_predict_samples,
+            self.n_features, random_state=1)
+
+
+class InferenceThroughputBench(_InferenceBench):
+    """Throughput of predict on a large batch split into chunks"""
+    param_names = ['estimator_name', 'backend', 'pickler', 'n_jobs',
+                   'chunk_size']
+    params = (sorted(ESTIMATORS), BACKENDS, PICKLERS, N_JOBS, CHUNK_SIZES)
+
+    def _run(self, backend, n_jobs, chunk_size):
+        from joblib import Parallel, delayed
+        X = self.X_predict
+        Parallel(backend=backend, n_jobs=n_jobs)(
+            delayed(self.estimator.predict)(X[i:i + chunk_size])
+            for i in range(0, len(X), chunk_size))
+
+    def time_chunked_predict(self, estimator_name, backend, pickler, n_jobs,
+                             chunk_size):
+        self._run(backend, n_jobs, chunk_size)
+
+    def track_predict_throughput(self, estimator_name, backend, pickler,
+                                 n_jobs, chunk_size):
+        t0 = timeit.default_timer()
+        self._run(backend, n_jobs, chunk_size)
+        return len(self.X_predict) / (timeit.default_timer() - t0)
+    track_predict_throughput.unit = 'rows/second'
+
+
+class InferenceLatencyBench(_InferenceBench):
+    """Latency of predict on single rows and small batches
+
+    With n_jobs > 1, each batch is split into n_jobs chunks predicted by an
+    already started pool, as a service parallelizing its requests would.
+    """
+    param_names = ['estimator_name', 'backend', 'pickler', 'n_jobs',
+                   'batch_size']
+    params = (sorted(ESTIMATORS), BACKENDS, PICKLERS, N_JOBS, BATCH_SIZES)
+
+    n_calls = N_LATENCY_CALLS
+
+    def _latencies(self, backend, n_jobs, batch_size):
+        from joblib import Parallel, delayed
+        predict = self.estimator.predict
+        batches = [self.X_predict[i * batch_size:(i + 1) * batch_size]
+                   for i in range(self.n_calls)]
+
+        latencies = []
+        with Parallel(backend=backend, n_jobs=n_jobs,
+                      batch_size=1) as parallel:
+            if n_jobs > 1:
+                # untimed first round, so that the workers are started and
+                # have imported the modules of the estimator before the
+                # measurements
+                parallel(delayed(predict)(self.X_predict[:1])
+                         for _ in range(n_jobs))
+            for batch in batches:
+                t0 = timeit.default_timer()
+                if n_jobs == 1:
+                    predict(batch)
+                else:
+                    chunks = np.array_split(batch, min(n_jobs, len(batch)))
+                    parallel(delayed(predict)(chunk) for chunk in chunks)
+                latencies.append(timeit.default_timer() - t0)
+        return np.array(latencies)
+
+    def track_p50_latency(self, estimator_name, backend, pickler, n_jobs,
+                          batch_size):
+        return np.percentile(self._latencies(backend, n_jobs, batch_size), 50)
+    track_p50_latency.unit = 'seconds'
+
+    def track_p99_latency(self, estimator_name, backend, pickler, n_jobs,
+                          batch_size):
+        return np.percentile(self._latencies(backend, n_jobs, batch_size), 99)
+    track_p99_latency.unit = 'seconds'
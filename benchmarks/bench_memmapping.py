@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Benchmark of joblib's automatic memmapping of large arrays sent to workers
+#
+# Author: Pierre Glaser
+import numpy as np
+
+from benchmarks.common import SklearnBenchmark
+from benchmarks.common import cached_arrays, with_memory_tracking
+
+
+def _array_checksum(X):
+    # touch all the pages of the array, as a fit would
+    return float(X.sum())
+
+
+@with_memory_tracking
+class MemmappingBench(SklearnBenchmark):
+    """Zero-copy memmapping vs copy-on-send of a large array
+
+    The same array is sent to n_tasks tasks. Arrays larger than max_nbytes are
+    dumped once to disk by joblib and opened with mmap_mode in the workers,
+    smaller ones are pickled and copied into each task.
+    """
+    param_names = ['backend', 'pickler', 'n_jobs', 'array_size_mb',
+                   'max_nbytes', 'mmap_mode']
+    params = (['multiprocessing', 'loky'],
+              ['pickle', 'cloudpickle'],
+              [4],
+              [1, 100, 1000, 4000],
+              [None, '1M', '100M'],
+              ['r', 'c'])
+    timeout = 600
+
+    # non-asv class attribute: orchestrate.py runs this benchmark alone, as
+    # its arrays (up to 4GB, copied in each worker) and memory bandwidth
+    # would be shared with the cases running next to it
+    exclusive = True
+
+    def setup(self, backend, pickler, n_jobs, array_size_mb, max_nbytes,
+              mmap_mode):
+        if max_nbytes is None and mmap_mode != 'r':
+            # memmapping is disabled, mmap_mode has no effect
+            raise NotImplementedError
+        super(MemmappingBench, self).setup(backend, pickler)
+
+        n_features = 100
+        n_samples = array_size_mb * 2 ** 20 // (8 * n_features)
+
+        def make_arrays():
+            rng = np.random.RandomState(0)
+            return rng.standard_normal((n_samples, n_features)),
+
+        X, = cached_arrays('standard_normal',
+                           dict(n_samples=n_samples, n_features=n_features,
+                                random_state=0), make_arrays)
+        # load the array in memory: joblib would send an existing memmap by
+        # reference, whatever max_nbytes
+        self.X = np.array(X)
+
+    def time_send_array(self, backend, pickler, n_jobs, array_size_mb,
+                        max_nbytes, mmap_mode):
+        from joblib import Parallel, delayed
+
+        Parallel(backend=backend, n_jobs=n_jobs, max_nbytes=max_nbytes,
+                 mmap_mode=mmap_mode)(delayed(_array_checksum)(self.X)
+                                      for _ in range(self.n_tasks))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Benchmark of nested parallelism: joblib workers running estimators that are
+# themselves parallel, through joblib or through BLAS/OpenMP threads
+#
+# Author: Pierre Glaser
+import os
+
+from benchmarks.common import RunnableThreadsSampler, SklearnBenchmark
+from benchmarks.common import clone_and_fit, make_cached_dataset
+
+BLAS_THREADS_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                          'MKL_NUM_THREADS']
+
+
+class NestedParallelismBench(SklearnBenchmark):
+    """Outer n_jobs x inner n_jobs x BLAS/OpenMP threads
+
+    The outer level is a joblib Parallel call (cross validation, grid search
+    or clone_and_fit tasks), the inner level the n_jobs of the estimator and
+    the number of threads of the BLAS and OpenMP thread pools of each worker.
+    The number of runnable threads per core observed during the run shows the
+    oversubscription of the machine.
+    """
+    param_names = ['backend', 'pickler', 'workload', 'outer_n_jobs',
+                   'inner_n_jobs', 'blas_threads']
+    params = (['multiprocessing', 'loky', 'threading'][1:],
+              ['pickle', 'cloudpickle'],
+              ['randomforest', 'randomforest_gridsearch', 'kernelridge'],
+              [1, 2, 4],
+              [1, 2, 4],
+              sorted({1, 4, os.cpu_count() or 1}))
+    timeout = 600
+
+    def setup(self, backend, pickler, workload, outer_n_jobs, inner_n_jobs,
+              blas_threads):
+        if workload == 'kernelridge' and inner_n_jobs != 1:
+            # KernelRidge is only parallel through BLAS
+            raise NotImplementedError
+        super(NestedParallelismBench, self).setup(backend, pickler)
+
+        # the thread pools of worker processes are sized from the environment
+        # when they start, so the loky workers have to be restarted. The
+        # values set before the run are restored in teardown
+        self._saved_environ = {var: os.environ.get(var)
+                               for var in BLAS_THREADS_VARIABLES}
+        for var in BLAS_THREADS_VARIABLES:
+            os.environ[var] = str(blas_threads)
+        from joblib.externals.loky import get_reusable_executor
+        get_reusable_executor().shutdown(wait=True)
+
+        n_samples = 5000 if workload == 'kernelridge' else 10000
+        X, y = make_cached_dataset('make_regression', n_samples, 10)
+        self.X = X
+        self.y = y
+
+    def teardown(self, backend, pickler, workload, outer_n_jobs,
+                 inner_n_jobs, blas_threads):
+        for var, value in self._saved_environ.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+        super(NestedParallelismBench, self).teardown(
+            backend, pickler, workload, outer_n_jobs, inner_n_jobs,
+            blas_threads)
+
+    def _run(self, backend, workload, outer_n_jobs, inner_n_jobs,
+             blas_threads):
+        from joblib import Parallel, delayed, parallel_backend
+        from threadpoolctl import threadpool_limits
+
+        # limit the thread pools of the parent, used by the threading backend
+        with threadpool_limits(limits=blas_threads), \
+                parallel_backend(backend):
+            if workload == 'randomforest':
+                from sklearn.ensemble import RandomForestRegressor
+                rf = RandomForestRegressor(n_estimators=50,
+                                           n_jobs=inner_n_jobs)
+                Parallel(n_jobs=outer_n_jobs)(
+                    delayed(clone_and_fit)(rf, self.X, self.y)
+                    for _ in range(4))
+            elif workload == 'randomforest_gridsearch':
+                from sklearn.ensemble import RandomForestRegressor
+                from sklearn.model_selection import GridSearchCV
+                rf = RandomForestRegressor(n_estimators=50,
+                                           n_jobs=inner_n_jobs)
+                params = {'max_depth': [5, 10, None]}
+                GridSearchCV(rf, params, cv=4, n_jobs=outer_n_jobs).fit(
+                    self.X, self.y)
+            else:
+                from sklearn.kernel_ridge import KernelRidge
+                from sklearn.model_selection import ShuffleSplit
+                from sklearn.model_selection import cross_val_score
+                cv = ShuffleSplit(n_splits=8, test_size=0.3)
+                cross_val_score(KernelRidge(), self.X, self.y, cv=cv,
+                                n_jobs=outer_n_jobs)
+
+    def time_nested_parallelism(self, backend, pickler, workload,
+                                outer_n_jobs, inner_n_jobs, blas_threads):
+        self._run(backend, workload, outer_n_jobs, inner_n_jobs,
+                  blas_threads)
+
+    def _sample_runnable_threads(self, *params):
+        backend, pickler, workload = params[:3]
+        with RunnableThreadsSampler() as sampler:
+            self._run(backend, workload, *params[3:])
+        return sampler
+
+    def track_mean_runnable_threads_per_core(self, *params):
+        return self._sample_runnable_threads(*params).mean
+    track_mean_runnable_threads_per_core.unit = 'threads/core'
+
+    def track_peak_runnable_threads_per_core(self, *params):
+        return self._sample_runnable_threads(*params).peak
+    track_peak_runnable_threads_per_core.unit = 'threads/core'
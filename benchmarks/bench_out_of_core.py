@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Benchmark of estimators streaming datasets larger than memory
+#
+# Author: Pierre Glaser
+import json
+import os
+import tempfile
+import timeit
+
+from benchmarks.common import ALL_CLASSIFIERS, ALL_REGRESSORS
+from benchmarks.common import ALL_TRANSFORMERS, CACHE_DIR
+from benchmarks.common import ChunkReader, MemorySampler, SklearnBenchmark
+from benchmarks.common import make_out_of_core_dataset
+from benchmarks.config import OUT_OF_CORE_SIZES
+
+# task of the generated dataset and parameters of each estimator
+ESTIMATORS = {
+    'SGDRegressor': (ALL_REGRESSORS, 'regression', {}),
+    'PassiveAggressiveRegressor': (ALL_REGRESSORS, 'regression', {}),
+    'SGDClassifier': (ALL_CLASSIFIERS, 'classification', {}),
+    'MiniBatchKMeans': (ALL_TRANSFORMERS, 'regression', {'n_clusters': 8}),
+    'IncrementalPCA': (ALL_TRANSFORMERS, 'regression', {'n_components': 10}),
+}
+
+N_FEATURES = 100
+CHUNK_SIZE = 10000
+
+
+def _physical_memory():
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+
+def _partial_fit(estimator, X, y):
+    if getattr(estimator, '_estimator_type', None) == 'classifier':
+        estimator.partial_fit(X, y, classes=[0, 1])
+    else:
+        estimator.partial_fit(X, y)
+
+
+def _transform_chunk(estimator, X):
+    # only the number of rows is sent back, the output of all the chunks
+    # would not fit in the memory of the parent
+    if hasattr(estimator, 'transform'):
+        return len(estimator.transform(X))
+    return len(estimator.predict(X))
+
+
+class OutOfCoreBench(SklearnBenchmark):
+    """Streaming partial_fit over an on-disk dataset larger than memory
+
+    The dataset is a .npy file of size times the physical memory of the
+    machine, generated once chunk by chunk. In the sequential and prefetch
+    modes, the estimator is fitted with partial_fit on chunks read by a
+    ChunkReader, the prefetch mode reading the next chunks in a background
+    thread while the current one is processed. In the parallel_transform
+    mode, a model fitted on the first chunk transforms (or predicts) all the
+    chunks in parallel with joblib. The chunks are read by a ChunkReader too,
+    and pickled to the workers rather than memory-mapped: the file-backed
+    pages of memory maps would count in the memory of the workers, and the
+    peak memory would not be comparable across modes. The stream is run
+    under a MemorySampler, and its throughput and peak memory are reported as
+    track_* metrics. asv calls setup once per track_* method: the first call
+    streams the dataset and writes both metrics to the run directory created
+    by setup_cache, the second one reads them back.
+    """
+    param_names = ['estimator_name', 'size', 'mode', 'n_jobs']
+    params = (sorted(ESTIMATORS),
+              OUT_OF_CORE_SIZES,
+              ['sequential', 'prefetch', 'parallel_transform'],
+              [1, 4])
+    timeout = 3600
+
+    # non-asv class attribute: orchestrate.py runs this benchmark alone, as
+    # it needs the whole memory of the machine
+    exclusive = True
+
+    def setup_cache(self):
+        # a new directory per run, so that the metrics of a previous run are
+        # never reported again
+        runs_dir = os.path.join(CACHE_DIR, 'out_of_core_runs')
+        os.makedirs(runs_dir, exist_ok=True)
+        return tempfile.mkdtemp(dir=runs_dir)
+
+    def setup(self, run_dir, estimator_name, size, mode, n_jobs):
+        if mode != 'parallel_transform' and n_jobs != 1:
+            # partial_fit consumes the chunks one after the other
+            raise NotImplementedError
+        super(OutOfCoreBench, self).setup('loky', 'cloudpickle')
+
+        path = os.path.join(run_dir, '{}_{}_{}_{}.json'.format(
+            estimator_name, size, mode, n_jobs))
+        if not os.path.exists(path):
+            metrics = self._stream(estimator_name, size, mode, n_jobs)
+            with open(path, 'w') as f:
+                json.dump(metrics, f)
+        with open(path) as f:
+            metrics = json.load(f)
+        self.rows_per_second = metrics['rows_per_second']
+        self.peak_memory = metrics['peak_memory']
+
+    def _stream(self, estimator_name, size, mode, n_jobs):
+        estimators, task, params = ESTIMATORS[estimator_name]
+        n_samples = int(size * _physical_memory() / (8 * N_FEATURES))
+        X, y = make_out_of_core_dataset(n_samples, N_FEATURES, task=task)
+        estimator = estimators[estimator_name](**params)
+        if mode == 'parallel_transform':
+            X_chunk, y_chunk = next(iter(ChunkReader((X, y), CHUNK_SIZE)))
+            _partial_fit(estimator, X_chunk, y_chunk)
+
+        with MemorySampler() as sampler:
+            start = timeit.default_timer()
+            if mode == 'parallel_transform':
+                self._parallel_transform(estimator, X, n_jobs)
+            else:
+                prefetch = 2 if mode == 'prefetch' else 0
+                for X_chunk, y_chunk in ChunkReader((X, y), CHUNK_SIZE,
+                                                    prefetch=prefetch):
+                    _partial_fit(estimator, X_chunk, y_chunk)
+            duration = timeit.default_timer() - start
+
+        peak = sampler.peak_total
+        return {'rows_per_second': n_samples / duration,
+                'peak_memory': peak[self.memory_metric] or peak['rss']}
+
+    def _parallel_transform(self, estimator, X, n_jobs):
+        from joblib import Parallel, delayed
+
+        # max_nbytes=None: send the chunks by pickling them, joblib would
+        # otherwise dump them to memory-mapped files
+        Parallel(backend='loky', n_jobs=n_jobs, max_nbytes=None)(
+            delayed(_transform_chunk)(estimator, X_chunk)
+            for X_chunk, in ChunkReader((X,), CHUNK_SIZE))
+
+    def track_rows_per_second(self, *params):
+        return self.rows_per_second
+    track_rows_per_second.unit = 'rows/s'
+
+    def track_peak_memory(self, *params):
+        return self.peak_memory
+    track_peak_memory.unit = 'bytes'
@@ -4,28 +4,36 @@
 #
 # Author: Pierre Glaser
 import os
+import time
 
 import numpy as np
 
 from benchmarks.common import EstimatorWithLargeList, SklearnBenchmark
+from benchmarks.common import load_20newsgroups, load_california_housing
+from benchmarks.common import make_cached_dataset, SerializationTracker
+from benchmarks.common import PageFaultSampler, TaskTracer
+from benchmarks.common import with_gil_profiling, with_memory_tracking
+from benchmarks.config import DATASET_SCALES, SCALING_N_JOBS
 
 
 
+@with_gil_profiling
+@with_memory_tracking
 class TwentyDataBench(SklearnBenchmark):
-    param_names = ['backend', 'pickler', 'n_jobs']
+    param_names = ['backend', 'pickler', 'n_jobs', 'scale']
     params = (['multiprocessing', 'loky', 'threading'][1:],
               ['pickle', 'cloudpickle'],
-              [1, 2, 4])
+              [1, 2, 4],
+              DATASET_SCALES)
+    # the default asv timeout times the largest scale: the workload grows
+    # with the number of samples, and the first setup generates the dataset
+    timeout = 120 * max(DATASET_SCALES)
 
-    def setup(self, backend, pickler, n_jobs):
+    def setup(self, backend, pickler, n_jobs, scale):
         super(TwentyDataBench, self).setup(backend, pickler)
+        self.X, self.y = load_20newsgroups(scale=scale)
 
-        from sklearn.datasets import fetch_20newsgroups
-        data = fetch_20newsgroups()
-        self.X = data.data
-        self.y = data.target
-
-    def time_text_vectorizer(self, backend, pickler, n_jobs):
+    def time_text_vectorizer(self, backend, pickler, n_jobs, scale):
         from sklearn.linear_model.stochastic_gradient import SGDClassifier
         from sklearn.feature_extraction.text import TfidfVectorizer
         from sklearn.pipeline import Pipeline
@@ -42,19 +50,23 @@ class TwentyDataBench(SklearnBenchmark):
                             n_jobs=n_jobs)
 
 
+@with_gil_profiling
+@with_memory_tracking
 class CaliforniaHousingBench(SklearnBenchmark):
-    param_names = ['backend', 'pickler', 'n_jobs']
+    param_names = ['backend', 'pickler', 'n_jobs', 'scale']
     params = (['multiprocessing', 'loky', 'threading'][1:],
               ['pickle', 'cloudpickle'],
-              [1, 2, 4])
+              [1, 2, 4],
+              DATASET_SCALES)
+    # the default asv timeout times the largest scale: the workload grows
+    # with the number of samples, and the first setup generates the dataset
+    timeout = 120 * max(DATASET_SCALES)
 
-    def setup(self, backend, pickler, n_jobs):
+    def setup(self, backend, pickler, n_jobs, scale):
         super(CaliforniaHousingBench, self).setup(backend, pickler)
+        self.X, self.y = load_california_housing(scale=scale)
 
-        from sklearn.datasets import fetch_california_housing
-        self.california_data = fetch_california_housing()
-
-    def time_kbins_polynomial_pipeline(self, backend, pickler, n_jobs):
+    def time_kbins_polynomial_pipeline(self, backend, pickler, n_jobs, scale):
         from sklearn.preprocessing import KBinsDiscretizer, PolynomialFeatures
         from sklearn.linear_model import Ridge
         from sklearn.pipeline import Pipeline
@@ -68,11 +80,11 @@ class CaliforniaHousingBench(SklearnBenchmark):
         cv = ShuffleSplit(n_splits=4, test_size=0.3)
 
         with parallel_backend(backend=backend):
-            cross_val_score(pipeline, self.california_data.data,
-                            self.california_data.target, cv=cv,
-                            n_jobs=n_jobs)
+            cross_val_score(pipeline, self.X, self.y, cv=cv, n_jobs=n_jobs)
 
 
+@with_gil_profiling
+@with_memory_tracking
 class MakeRegressionDataBench(SklearnBenchmark):
     param_names = ['backend', 'pickler', 'n_jobs', 'n_samples', 'n_features']
     params = (['multiprocessing', 'loky', 'threading'][1:],
@@ -83,8 +95,7 @@ class MakeRegressionDataBench(SklearnBenchmark):
 
     def setup(self, backend, pickler, n_jobs, n_samples, n_features):
         super(MakeRegressionDataBench, self).setup(backend, pickler)
-        from sklearn.datasets import make_regression
-        X, y = make_regression(n_samples, n_features)
+        X, y = make_cached_dataset('make_regression', n_samples, n_features)
         self.X = X
         self.y = y
 
@@ -164,3 +175,209 @@ class MakeRegressionDataBench(SklearnBenchmark):
             [1, 2, 4],
             [10000],
             [10])
+
+
+@with_memory_tracking
+class ScalingBench(SklearnBenchmark):
+    """Strong and weak scaling of some MakeRegressionDataBench workloads
+
+    n_jobs goes up to the number of cpus of the machine. In weak scaling mode,
+    n_samples is the number of samples per worker.
+    """
+    param_names = ['backend', 'pickler', 'n_jobs', 'scaling', 'n_samples',
+                   'n_features']
+    params = (['multiprocessing', 'loky', 'threading'][1:],
+              ['pickle', 'cloudpickle'],
+              SCALING_N_JOBS,
+              ['strong', 'weak'],
+              [10000],
+              [10])
+    timeout = 600
+
+    def setup(self, backend, pickler, n_jobs, scaling, n_samples,
+              n_features):
+        super(ScalingBench, self).setup(backend, pickler)
+        n_samples = self.scale_n_samples(n_samples, n_jobs, scaling)
+        X, y = make_cached_dataset('make_regression', n_samples, n_features)
+        self.X = X
+        self.y = y
+
+    def time_ridge_gridsearch(self, backend, pickler, n_jobs, scaling,
+                              n_samples, n_features):
+        from sklearn.linear_model import Ridge
+        from sklearn.model_selection import GridSearchCV
+        from joblib import parallel_backend
+
+        params = {'alpha': [2**-i for i in range(1, 40)]}
+        ridge = Ridge()
+        with parallel_backend(backend=backend):
+            rcv = GridSearchCV(ridge, params, cv=50, n_jobs=n_jobs)
+            rcv.fit(self.X, self.y)
+
+    def time_randomforest(self, backend, pickler, n_jobs, scaling, n_samples,
+                          n_features):
+        from sklearn.ensemble.forest import RandomForestRegressor
+        from joblib import parallel_backend
+
+        with parallel_backend(backend):
+            rf = RandomForestRegressor(n_estimators=100, n_jobs=n_jobs)
+            rf.fit(self.X, self.y)
+
+
+class SerializationBench(SklearnBenchmark):
+    """Serialization cost of the MakeRegressionDataBench workloads
+
+    Each workload is run once in setup under a SerializationTracker, and the
+    recorded quantities are reported as track_* metrics, separately from the
+    wall time measured by MakeRegressionDataBench.
+    """
+    param_names = ['backend', 'pickler', 'n_jobs', 'workload', 'n_samples',
+                   'n_features']
+    params = (['multiprocessing', 'loky', 'threading'][1:],
+              ['pickle', 'cloudpickle'],
+              [1, 2, 4],
+              ['send_list', 'gridsearch_large_list', 'ridge_gridsearch',
+               'randomforest'],
+              [10000],
+              [10])
+
+    def setup(self, backend, pickler, n_jobs, workload, n_samples,
+              n_features):
+        super(SerializationBench, self).setup(backend, pickler)
+
+        X, y = make_cached_dataset('make_regression', n_samples, n_features)
+        self.X = X
+        self.y = y
+
+        workload_func = getattr(MakeRegressionDataBench,
+                                'time_{}'.format(workload))
+        with SerializationTracker(pickler) as tracker:
+            workload_func(self, backend, pickler, n_jobs, n_samples,
+                          n_features)
+        self.tracker = tracker
+
+    def track_serialized_bytes(self, *params):
+        return self.tracker.serialized_bytes
+    track_serialized_bytes.unit = 'bytes'
+
+    def track_parent_serialization_time(self, *params):
+        return self.tracker.parent_time
+    track_parent_serialization_time.unit = 'seconds'
+
+    def track_worker_serialization_time(self, *params):
+        return self.tracker.worker_time
+    track_worker_serialization_time.unit = 'seconds'
+
+    def track_n_dispatched_tasks(self, *params):
+        return self.tracker.n_tasks
+    track_n_dispatched_tasks.unit = 'tasks'
+
+
+class StartMethodBench(SklearnBenchmark):
+    """Cold start of process-based backends for each start method
+
+    The workers of the multiprocessing and loky backends are started with
+    fork, spawn or forkserver (with scikit-learn preloaded in the fork
+    server). A MakeRegressionDataBench workload is run once in setup on
+    freshly started workers. Whatever the start method, the tasks receive X
+    through their arguments: pickled, or memory-mapped by joblib above its
+    max_nbytes threshold (1MB, so with 300000 samples), and never through
+    the pages a forked worker shares with the parent. The page faults of
+    each worker, since it started, thus count the memory of the modules it
+    imports (again, with spawn) or inherits and writes to (with fork), on top
+    of the data it unpickles or maps. They are reported as track_* metrics
+    along with the time until the first result is collected.
+    """
+    param_names = ['backend', 'start_method', 'n_jobs', 'workload',
+                   'n_samples', 'n_features']
+    params = (['multiprocessing', 'loky'],
+              ['fork', 'spawn', 'forkserver'],
+              [2, 4],
+              ['ridge_gridsearch', 'gridsearch_large_list'],
+              [10000, 300000],
+              [10])
+    timeout = 600
+
+    # modules imported by the fork server before forking workers
+    forkserver_preload = ['sklearn', 'sklearn.linear_model',
+                          'sklearn.model_selection']
+
+    def _set_start_method(self, backend, start_method):
+        # returns the start method in use, to be restored in teardown
+        import multiprocessing
+        import joblib.parallel
+        from joblib.externals.loky.backend import context
+
+        if backend == 'multiprocessing':
+            previous = joblib.parallel.DEFAULT_MP_CONTEXT
+            joblib.parallel.DEFAULT_MP_CONTEXT = (
+                multiprocessing.get_context(start_method)
+                if isinstance(start_method, str) else start_method)
+        else:
+            previous = context.get_start_method()
+            context.set_start_method(start_method, force=True)
+        return previous
+
+    def setup(self, backend, start_method, n_jobs, workload, n_samples,
+              n_features):
+        super(StartMethodBench, self).setup(backend, 'cloudpickle')
+        import multiprocessing
+        from joblib.externals.loky import get_reusable_executor
+
+        if start_method == 'forkserver':
+            multiprocessing.get_context('forkserver').set_forkserver_preload(
+                self.forkserver_preload)
+        self._previous_start_method = self._set_start_method(backend,
+                                                             start_method)
+        # workers started earlier with another start method are not reused
+        get_reusable_executor().shutdown(wait=True)
+
+        X, y = make_cached_dataset('make_regression', n_samples, n_features)
+        # load X in the memory of the parent, instead of memory-mapping it
+        self.X = np.array(X)
+        self.y = np.array(y)
+
+        workload_func = getattr(MakeRegressionDataBench,
+                                'time_{}'.format(workload))
+        with TaskTracer(measure_payloads=False) as tracer, \
+                PageFaultSampler() as sampler:
+            start = time.time()
+            workload_func(self, backend, 'cloudpickle', n_jobs, n_samples,
+                          n_features)
+            self.run_time = time.time() - start
+        self.time_to_first_result = min(
+            batch['collect'] for batch in tracer.batches.values()
+            if batch['collect'] is not None) - start
+
+        # only count the processes which ran tasks, not the fork server or
+        # the resource trackers
+        worker_pids = {event['pid'] for event in tracer.worker_events}
+        faults = [sampler.page_faults[pid] for pid in worker_pids
+                  if pid in sampler.page_faults]
+        self.minor_page_faults = np.mean([f[0] for f in faults])
+        self.major_page_faults = np.mean([f[1] for f in faults])
+
+    def teardown(self, backend, start_method, n_jobs, workload, n_samples,
+                 n_features):
+        from joblib.externals.loky import get_reusable_executor
+
+        get_reusable_executor().shutdown(wait=True)
+        self._set_start_method(backend, self._previous_start_method)
+        super(StartMethodBench, self).teardown(
+            backend, start_method, n_jobs, workload, n_samples, n_features)
+
+    def track_time_to_first_result(self, *params):
+        return self.time_to_first_result
+    track_time_to_first_result.unit = 'seconds'
+
+    def track_cold_run_time(self, *params):
+        return self.run_time
+    track_cold_run_time.unit = 'seconds'
+
+    def track_minor_page_faults_per_worker(self, *params):
+        return self.minor_page_faults
+    track_minor_page_faults_per_worker.unit = 'faults'
+
+    def track_major_page_faults_per_worker(self, *params):
+        return self.major_page_faults
+    track_major_page_faults_per_worker.unit = 'faults'
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Benchmark of the caching of pipeline transformers with joblib.Memory
+#
+# Author: Pierre Glaser
+import os
+import shutil
+import tempfile
+import timeit
+
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+
+from benchmarks.common import SklearnBenchmark
+from benchmarks.common import load_20newsgroups, load_california_housing
+
+
+def _cache_size(location):
+    # total size in bytes of the results stored in a joblib cache
+    size = 0
+    for dirpath, _, filenames in os.walk(location):
+        for filename in filenames:
+            size += os.path.getsize(os.path.join(dirpath, filename))
+    return size
+
+
+class FitCountingTransformer(BaseEstimator, TransformerMixin):
+    """transformer wrapper recording each of its fits as a file in log_dir
+
+    With Pipeline(memory=...), the transformers are only fitted on cache
+    misses. The fits are recorded in whichever worker runs them, including
+    the ones computing an entry another worker is computing concurrently.
+    """
+    def __init__(self, transformer=None, log_dir=None):
+        self.transformer = transformer
+        self.log_dir = log_dir
+
+    def _record_fit(self):
+        fd, _ = tempfile.mkstemp(prefix='fit_', dir=self.log_dir)
+        os.close(fd)
+
+    def fit(self, X, y=None):
+        self._record_fit()
+        self.transformer_ = clone(self.transformer).fit(X, y)
+        return self
+
+    def fit_transform(self, X, y=None):
+        self._record_fit()
+        self.transformer_ = clone(self.transformer)
+        return self.transformer_.fit_transform(X, y)
+
+    def transform(self, X):
+        return self.transformer_.transform(X)
+
+
+class PipelineCachingBench(SklearnBenchmark):
+    """GridSearchCV over the final estimator of a pipeline with a cache
+
+    The transformers of the pipeline (TfidfVectorizer, or KBinsDiscretizer
+    and PolynomialFeatures) do not depend on the searched hyperparameter, so
+    with Pipeline(memory=...) they only need to be fitted once per split. The
+    cache is a single directory shared by all the workers. It is empty before
+    the timed run with cache='cold', and populated by an identical run in
+    setup with cache='warm'.
+    """
+    param_names = ['backend', 'pickler', 'n_jobs', 'pipeline', 'cache']
+    params = (['multiprocessing', 'loky', 'threading'][1:],
+              ['pickle', 'cloudpickle'],
+              [1, 2, 4],
+              ['text_vectorizer', 'kbins_polynomial'],
+              ['none', 'cold', 'warm'])
+    timeout = 600
+
+    n_splits = 4
+
+    def setup(self, backend, pickler, n_jobs, pipeline, cache):
+        super(PipelineCachingBench, self).setup(backend, pickler)
+        if pipeline == 'text_vectorizer':
+            self.X, self.y = load_20newsgroups()
+            self.n_transformers = 1
+        else:
+            self.X, self.y = load_california_housing()
+            self.n_transformers = 2
+
+        self.location = tempfile.mkdtemp(prefix='pipeline_cache_')
+        self.fit_log = tempfile.mkdtemp(prefix='pipeline_fits_')
+        if cache == 'warm':
+            self._run(backend, n_jobs, pipeline, cache)
+
+    def teardown(self, backend, pickler, n_jobs, pipeline, cache):
+        shutil.rmtree(self.location, ignore_errors=True)
+        shutil.rmtree(self.fit_log, ignore_errors=True)
+        super(PipelineCachingBench, self).teardown(
+            backend, pickler, n_jobs, pipeline, cache)
+
+    def _make_search(self, n_jobs, pipeline, cache):
+        from sklearn.model_selection import GridSearchCV, ShuffleSplit
+        from sklearn.pipeline import Pipeline
+
+        memory = None if cache == 'none' else self.location
+        if pipeline == 'text_vectorizer':
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            from sklearn.linear_model import SGDClassifier
+            steps = [('tfidf', TfidfVectorizer()),
+                     ('estimator', SGDClassifier())]
+            params = {'estimator__alpha': [1e-4, 1e-5, 1e-6]}
+        else:
+            from sklearn.linear_model import Ridge
+            from sklearn.preprocessing import KBinsDiscretizer
+            from sklearn.preprocessing import PolynomialFeatures
+            steps = [('discretizer', KBinsDiscretizer(encode='onehot')),
+                     ('polynomial_features', PolynomialFeatures()),
+                     ('estimator', Ridge())]
+            params = {'estimator__alpha': [0.1, 1, 10]}
+
+        # the transformers record their fits, counted by track_cache_hit_rate
+        steps = [(name, FitCountingTransformer(step, self.fit_log))
+                 for name, step in steps[:-1]] + steps[-1:]
+
+        # fixed splits, so that a warm cache matches the folds of the run
+        cv = ShuffleSplit(n_splits=self.n_splits, test_size=0.3,
+                          random_state=0)
+        return GridSearchCV(Pipeline(steps, memory=memory), params, cv=cv,
+                            n_jobs=n_jobs)
+
+    def _run(self, backend, n_jobs, pipeline, cache):
+        from joblib import parallel_backend
+        search = self._make_search(n_jobs, pipeline, cache)
+        with parallel_backend(backend):
+            search.fit(self.X, self.y)
+        return search
+
+    def time_cached_gridsearch(self, backend, pickler, n_jobs, pipeline,
+                               cache):
+        self._run(backend, n_jobs, pipeline, cache)
+
+    def track_cache_hit_rate(self, backend, pickler, n_jobs, pipeline,
+                             cache):
+        if cache == 'none':
+            return 0.
+        n_fits_before = len(os.listdir(self.fit_log))
+        search = self._run(backend, n_jobs, pipeline, cache)
+        n_fits_after = len(os.listdir(self.fit_log))
+
+        # each transformer is fitted once per candidate and split, and once
+        # more when refitting the best candidate, unless the cache has it.
+        # The actual fits are counted rather than the new cache entries: with
+        # n_jobs > 1, several workers can miss the same entry concurrently
+        # and compute it, but only one entry is written
+        n_candidates = len(search.cv_results_['params'])
+        n_calls = (n_candidates * self.n_splits + 1) * self.n_transformers
+        n_misses = n_fits_after - n_fits_before
+        return 1 - n_misses / n_calls
+    track_cache_hit_rate.unit = 'hits/call'
+
+    def track_cache_size(self, backend, pickler, n_jobs, pipeline, cache):
+        self._run(backend, n_jobs, pipeline, cache)
+        return _cache_size(self.location)
+    track_cache_size.unit = 'bytes'
+
+    def track_time_saved(self, backend, pickler, n_jobs, pipeline, cache):
+        if cache == 'none':
+            return 0.
+        t0 = timeit.default_timer()
+        self._run(backend, n_jobs, pipeline, 'none')
+        t1 = timeit.default_timer()
+        self._run(backend, n_jobs, pipeline, cache)
+        t2 = timeit.default_timer()
+        return (t1 - t0) - (t2 - t1)
+    track_time_saved.unit = 'seconds'
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Benchmark of sparse (CSR) inputs sent to the workers of joblib's backends
+#
+# Author: Pierre Glaser
+import numpy as np
+
+from benchmarks.common import SklearnBenchmark
+from benchmarks.common import cached_arrays, clone_and_fit
+from benchmarks.common import with_memory_tracking
+
+
+def make_cached_csr(n_rows, n_features, density, random_state=0):
+    """generate a CSR matrix and a regression target, once
+
+    Each row has round(density * n_features) non-zero entries, one in each of
+    as many equal-width blocks of columns, so that the indices of a row are
+    distinct and sorted without any per-row sort. The data, indices and
+    indptr arrays are cached, and the returned matrix is backed by read-only
+    memory maps of them.
+    """
+    import scipy.sparse as sp
+
+    nnz_per_row = max(1, int(round(density * n_features)))
+    block_width = n_features // nnz_per_row
+
+    def make_arrays():
+        rng = np.random.RandomState(random_state)
+        indices = (rng.randint(block_width, size=(n_rows, nnz_per_row)) +
+                   np.arange(nnz_per_row) * block_width).astype(np.int32)
+        data = rng.standard_normal(n_rows * nnz_per_row)
+        indptr = np.arange(0, n_rows * nnz_per_row + 1, nnz_per_row,
+                           dtype=np.int64)
+        X = sp.csr_matrix((data, indices.ravel(), indptr),
+                          shape=(n_rows, n_features))
+        y = X.dot(rng.standard_normal(n_features)) + rng.standard_normal(
+            n_rows)
+        return data, indices.ravel(), indptr, y
+
+    data, indices, indptr, y = cached_arrays(
+        'csr', dict(n_rows=n_rows, n_features=n_features, density=density,
+                    random_state=random_state), make_arrays)
+    return sp.csr_matrix((data, indices, indptr), shape=(n_rows, n_features),
+                         copy=False), y
+
+
+def _touch(X):
+    # no-op task reading all the data sent to the worker
+    data = X.data if hasattr(X, 'indptr') else X
+    return float(data.sum())
+
+
+def _make_estimator(estimator_name):
+    if estimator_name == 'SGDClassifier':
+        from sklearn.linear_model import SGDClassifier
+        return SGDClassifier(max_iter=5, tol=None)
+    elif estimator_name == 'LinearSVC':
+        from sklearn.svm import LinearSVC
+        return LinearSVC()
+    elif estimator_name == 'Ridge':
+        from sklearn.linear_model import Ridge
+        return Ridge(solver='sparse_cg')
+    elif estimator_name == 'NearestNeighbors':
+        from sklearn.neighbors import NearestNeighbors
+        return NearestNeighbors(algorithm='brute')
+    raise ValueError('unknown estimator: {}'.format(estimator_name))
+
+
+@with_memory_tracking
+class SparseInputBench(SklearnBenchmark):
+    """Fitting estimators on CSR matrices, or on dense arrays of equal size
+
+    n_tasks clones of the estimator are fitted in parallel on the same data,
+    which is therefore sent to every worker: the data, indices and indptr
+    arrays of a CSR matrix are memmapped by joblib like any other large
+    in-memory array. With format='dense', the data is a dense array with
+    n_features columns, and as many rows as needed to take as many bytes as
+    the CSR matrix.
+
+    Both formats hold the same number of bytes, but not the same problem: the
+    fits of time_parallel_fit are not comparable across formats.
+    time_send_data isolates the cost of sending the data to the workers (and
+    of memmapping it), with n_tasks no-op tasks reading it.
+
+    The largest case (10M rows with density 0.01) holds about 12GB of CSR
+    data, loaded in memory, and as much in the temporary folder where joblib
+    dumps it for the workers.
+    """
+    param_names = ['backend', 'pickler', 'n_jobs', 'estimator_name',
+                   'format', 'n_rows', 'density', 'n_features']
+    params = (['multiprocessing', 'loky', 'threading'][1:],
+              ['pickle', 'cloudpickle'],
+              [1, 2, 4],
+              ['SGDClassifier', 'LinearSVC', 'Ridge', 'NearestNeighbors'],
+              ['csr', 'dense'],
+              [100000, 1000000, 10000000],
+              [0.001, 0.01],
+              [10000])
+    timeout = 1200
+
+    # non-asv class attribute: orchestrate.py runs this benchmark alone, as
+    # the largest matrices need several GB of memory
+    exclusive = True
+
+    n_tasks = 4
+
+    def setup(self, backend, pickler, n_jobs, estimator_name, format,
+              n_rows, density, n_features):
+        super(SparseInputBench, self).setup(backend, pickler)
+        import scipy.sparse as sp
+
+        X, y = make_cached_csr(n_rows, n_features, density)
+        # load the arrays in memory, like the dense array: joblib would send
+        # the existing memmaps by reference, and dump the dense array on each
+        # call, comparing the transports rather than the formats
+        X = sp.csr_matrix((np.array(X.data), np.array(X.indices),
+                           np.array(X.indptr)), shape=X.shape, copy=False)
+        y = np.array(y)
+
+        if format == 'dense':
+            nbytes = X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+            n_dense_rows = max(1, nbytes // (8 * n_features))
+            rng = np.random.RandomState(0)
+            X = rng.standard_normal((n_dense_rows, n_features))
+            y = y[:n_dense_rows] if n_dense_rows <= len(y) else \
+                rng.standard_normal(n_dense_rows)
+
+        if estimator_name in ('SGDClassifier', 'LinearSVC'):
+            y = (y > 0).astype(np.int64)
+        self.X = X
+        self.y = y
+
+    def time_parallel_fit(self, backend, pickler, n_jobs, estimator_name,
+                          format, n_rows, density, n_features):
+        from joblib import Parallel, delayed
+        estimator = _make_estimator(estimator_name)
+        Parallel(backend=backend, n_jobs=n_jobs)(delayed(clone_and_fit)(
+            estimator, self.X, self.y) for _ in range(self.n_tasks))
+
+    def time_send_data(self, backend, pickler, n_jobs, estimator_name,
+                       format, n_rows, density, n_features):
+        from joblib import Parallel, delayed
+        Parallel(backend=backend, n_jobs=n_jobs)(
+            delayed(_touch)(self.X) for _ in range(self.n_tasks))
+
+    # the estimator does not matter when only sending the data
+    time_send_data.param_names = param_names
+    time_send_data.params = params[:3] + (params[3][:1],) + params[4:]
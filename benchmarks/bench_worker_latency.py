@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Benchmark of the fixed per-call overhead of joblib's backends: worker
+# startup, pool reuse and task dispatch latency
+#
+# Author: Pierre Glaser
+import time
+import timeit
+
+from benchmarks.common import SklearnBenchmark
+# the tasks are defined in a module that does not import scikit-learn, so
+# that unpickling them does not import it in the workers either
+from benchmarks.worker_tasks import import_sklearn, noop
+
+
+def _shutdown_pools():
+    # make sure the next Parallel call starts its workers from scratch.
+    # multiprocessing and threading pools are created for each Parallel call
+    # anyway, only loky keeps its workers alive between calls
+    from joblib.externals.loky import get_reusable_executor
+    get_reusable_executor().shutdown(wait=True)
+
+
+class ColdStartBench(SklearnBenchmark):
+    """Time to create a pool and run one no-op task per worker"""
+    param_names = ['backend', 'pickler', 'n_jobs']
+    params = (['multiprocessing', 'loky', 'threading'],
+              ['pickle', 'cloudpickle'],
+              [1, 2, 4])
+
+    def setup(self, backend, pickler, n_jobs):
+        super(ColdStartBench, self).setup(backend, pickler)
+        _shutdown_pools()
+
+    def time_cold_start(self, backend, pickler, n_jobs):
+        from joblib import Parallel, delayed
+        Parallel(backend=backend, n_jobs=n_jobs)(
+            delayed(noop)() for _ in range(n_jobs))
+
+
+class WorkerImportBench(SklearnBenchmark):
+    """Cost of importing scikit-learn inside freshly started workers
+
+    Depending on the start method of the backend, the workers either inherit
+    the modules imported by the parent (fork) or import them again. The time
+    until the last worker starts its task (spawn time) and the time it spends
+    importing are reported separately.
+    """
+    param_names = ['backend', 'pickler', 'n_jobs']
+    params = (['multiprocessing', 'loky', 'threading'],
+              ['pickle', 'cloudpickle'],
+              [1, 2, 4])
+
+    def setup(self, backend, pickler, n_jobs):
+        super(WorkerImportBench, self).setup(backend, pickler)
+        _shutdown_pools()
+
+        # the track_* methods report this cold run
+        t0 = time.time()
+        started, import_times, n_modules = zip(*self._run(backend, n_jobs))
+        self.spawn_time = max(started) - t0
+        self.import_time = max(import_times)
+        self.n_imported_modules = max(n_modules)
+        _shutdown_pools()
+
+    def _run(self, backend, n_jobs):
+        from joblib import Parallel, delayed
+        return Parallel(backend=backend, n_jobs=n_jobs, batch_size=1)(
+            delayed(import_sklearn)() for _ in range(n_jobs))
+
+    def time_cold_start_import_sklearn(self, backend, pickler, n_jobs):
+        self._run(backend, n_jobs)
+
+    def track_worker_spawn_time(self, backend, pickler, n_jobs):
+        return self.spawn_time
+    track_worker_spawn_time.unit = 'seconds'
+
+    def track_worker_import_time(self, backend, pickler, n_jobs):
+        return self.import_time
+    track_worker_import_time.unit = 'seconds'
+
+    def track_worker_imported_modules(self, backend, pickler, n_jobs):
+        return self.n_imported_modules
+    track_worker_imported_modules.unit = 'modules'
+
+
+class _WarmPoolBench(SklearnBenchmark):
+    param_names = ['backend', 'pickler', 'n_jobs']
+    params = (['multiprocessing', 'loky', 'threading'],
+              ['pickle', 'cloudpickle'],
+              [1, 2, 4])
+
+    def setup(self, backend, pickler, n_jobs):
+        super(_WarmPoolBench, self).setup(backend, pickler)
+        from joblib import Parallel, delayed
+
+        # the pool is kept alive until teardown, and warmed up by a first call
+        self.parallel = Parallel(backend=backend, n_jobs=n_jobs, batch_size=1)
+        self.parallel.__enter__()
+        self.parallel(delayed(noop)() for _ in range(n_jobs))
+
+    def teardown(self, backend, pickler, n_jobs):
+        self.parallel.__exit__(None, None, None)
+        super(_WarmPoolBench, self).teardown(backend, pickler, n_jobs)
+
+
+class WarmReuseBench(_WarmPoolBench):
+    """Time to run one no-op task per worker on an already started pool"""
+
+    def time_warm_reuse(self, backend, pickler, n_jobs):
+        from joblib import delayed
+        self.parallel(delayed(noop)() for _ in range(n_jobs))
+
+
+class NoopDispatchBench(_WarmPoolBench):
+    """Per-task dispatch latency of no-op tasks on an already started pool"""
+    n_noop_tasks = 1000
+
+    def _run(self):
+        from joblib import delayed
+        self.parallel(delayed(noop)() for _ in range(self.n_noop_tasks))
+
+    def time_noop_dispatch(self, backend, pickler, n_jobs):
+        self._run()
+
+    def track_noop_task_latency(self, backend, pickler, n_jobs):
+        t0 = timeit.default_timer()
+        self._run()
+        return (timeit.default_timer() - t0) / self.n_noop_tasks
+    track_noop_task_latency.unit = 'seconds'
@@ -21,19 +21,547 @@ number and repeat attributes differ in the sense that a setup and teardown
 call is run between two iterations of loop 2, in opposition with loop 5.
 
 """
+import hashlib
+import inspect
+import json
+import math
 import os
+import pickle
+import platform
+import socket
+import sys
+import threading
+import time
 import timeit
 import numpy as np
 from sklearn.utils.testing import all_estimators
 from sklearn.base import clone
 
+from benchmarks.config import EXPECTED_FIT_TIME, FINGERPRINT_DIR
+from benchmarks.config import NIGHTLY_TIME_BUDGET
+from benchmarks.config import NON_NEGATIVE_ESTIMATORS, REPEAT, ROTATION
+from benchmarks.config import TRACE_DIR, UNSUPPORTED_ESTIMATORS, WARMUP_TIME
 
-ALL_REGRESSORS = {k: v for k, v in all_estimators(
-    include_meta_estimators=False, type_filter='regressor')}
-ALL_CLASSIFIERS = {k: v for k, v in all_estimators(
-    include_meta_estimators=False, type_filter='classifier')}
-ALL_TRANSFORMERS = {k: v for k, v in all_estimators(
-    include_meta_estimators=False, type_filter='transformer')}
+
+def _is_standalone(name, cls):
+    # private estimators (_BaseEncoder, _SigmoidCalibration...) and the ones
+    # requiring constructor arguments, such as the meta-estimators
+    # VotingClassifier or OneVsRestClassifier, cannot be benchmarked on their
+    # own. include_meta_estimators has no effect since scikit-learn 0.21
+    if name.startswith('_'):
+        return False
+    parameters = list(inspect.signature(cls.__init__).parameters.values())
+    return all(p.default is not p.empty or
+               p.kind in (p.VAR_POSITIONAL, p.VAR_KEYWORD)
+               for p in parameters[1:])
+
+
+def _standalone_estimators(type_filter):
+    return {k: v for k, v in all_estimators(
+        include_meta_estimators=False, type_filter=type_filter)
+        if _is_standalone(k, v)}
+
+
+ALL_REGRESSORS = _standalone_estimators('regressor')
+ALL_CLASSIFIERS = _standalone_estimators('classifier')
+ALL_TRANSFORMERS = _standalone_estimators('transformer')
+
+
+# Directory where generated datasets are persisted between setup calls. The
+# arrays are stored as .npy files and loaded back as read-only memory maps, so
+# that repeated setups are cheap and process-based workers can share pages.
+CACHE_DIR = os.environ.get(
+    'SKLEARN_BENCHMARKS_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache',
+                 'sklearn_parallel_benchmarks'))
+
+
+def _get_generator(generator):
+    import sklearn.datasets
+    if callable(generator):
+        return generator.__name__, generator
+    return generator, getattr(sklearn.datasets, generator)
+
+
+def cached_array_files(name, key, write_arrays, mmap_mode='r'):
+    """load a tuple of arrays from the cache, writing them if needed
+
+    ``key`` is a dict of parameters identifying the arrays, ``write_arrays``
+    a callable writing them as .npy files into the directory it is given,
+    which allows generating arrays larger than memory chunk by chunk. The
+    arrays are returned, sorted by file name, as memory-mapped views
+    (read-only by default).
+    """
+    key_repr = repr(sorted(key.items()))
+    digest = hashlib.sha1(key_repr.encode('utf-8')).hexdigest()[:16]
+    cache_dir = os.path.join(CACHE_DIR, name, digest)
+
+    filenames = None
+    if os.path.isdir(cache_dir):
+        filenames = sorted(f for f in os.listdir(cache_dir)
+                           if f.endswith('.npy'))
+
+    if not filenames:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # write to a temporary directory and rename it afterwards, so that
+        # concurrent setups never observe a partially written entry
+        tmp_dir = '{}.tmp-{}'.format(cache_dir, os.getpid())
+        os.makedirs(tmp_dir, exist_ok=True)
+        write_arrays(tmp_dir)
+        filenames = sorted(f for f in os.listdir(tmp_dir)
+                           if f.endswith('.npy'))
+        with open(os.path.join(tmp_dir, 'key.txt'), 'w') as f:
+            f.write(key_repr)
+        try:
+            os.rename(tmp_dir, cache_dir)
+        except OSError:
+            # another process populated the cache first
+            import shutil
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return tuple(np.load(os.path.join(cache_dir, filename),
+                         mmap_mode=mmap_mode)
+                 for filename in filenames)
+
+
+def cached_arrays(name, key, make_arrays, mmap_mode='r'):
+    """load a tuple of arrays from the cache, creating them if needed
+
+    ``key`` is a dict of parameters identifying the arrays, ``make_arrays`` a
+    callable taking no argument and returning a tuple of numpy arrays. The
+    arrays are persisted once as .npy files, and are returned as memory-mapped
+    views (read-only by default).
+    """
+    def write_arrays(directory):
+        for i, array in enumerate(make_arrays()):
+            # np.save keeps the memory layout (C or Fortran order) of arrays
+            np.save(os.path.join(directory, 'array_{:02d}.npy'.format(i)),
+                    array)
+
+    return cached_array_files(name, key, write_arrays, mmap_mode=mmap_mode)
+
+
+def make_cached_dataset(generator, n_samples, n_features, n_targets=1,
+                        random_state=0, mmap_mode='r', dtype='float64',
+                        order='C', **kwargs):
+    """generate a (X, y) dataset once and return memory-mapped views of it
+
+    ``generator`` is either the name of a sklearn.datasets generator (such as
+    ``'make_regression'``) or the generator itself. Datasets are keyed by
+    (generator, n_samples, n_features, n_targets, random_state), the dtype
+    and memory layout ('C' or 'F' order) of X, and any extra keyword argument
+    passed to the generator. Floating point targets are cast to dtype too.
+    """
+    generator_name, generator_func = _get_generator(generator)
+    generator_kwargs = dict(kwargs, n_samples=n_samples,
+                            n_features=n_features, random_state=random_state)
+    # not all generators support multi-output targets
+    if n_targets != 1:
+        generator_kwargs['n_targets'] = n_targets
+
+    def make_arrays():
+        X, y = generator_func(**generator_kwargs)
+        X = np.asarray(X, dtype=dtype, order=order)
+        if np.issubdtype(y.dtype, np.floating):
+            y = y.astype(dtype)
+        return X, y
+
+    key = dict(generator_kwargs, n_targets=n_targets)
+    # the keys of datasets in the default layout do not mention it
+    if dtype != 'float64' or order != 'C':
+        key.update(dtype=dtype, order=order)
+    return cached_arrays(generator_name, key, make_arrays,
+                         mmap_mode=mmap_mode)
+
+
+def make_out_of_core_dataset(n_samples, n_features, task='regression',
+                             chunk_size=100000, random_state=0):
+    """generate a (X, y) dataset on disk chunk by chunk, and memory-map it
+
+    Unlike make_cached_dataset, the dataset is never held in memory as a
+    whole, so that it can be larger than the memory of the machine. X is a
+    C-ordered float64 array of gaussian features, y a noisy linear function
+    of X for the regression task, or its sign (0 or 1) for the
+    classification one.
+    """
+    def write_arrays(directory):
+        rng = np.random.RandomState(random_state)
+        coef = rng.randn(n_features)
+        X = np.lib.format.open_memmap(
+            os.path.join(directory, 'array_00.npy'), mode='w+',
+            dtype='float64', shape=(n_samples, n_features))
+        y = np.lib.format.open_memmap(
+            os.path.join(directory, 'array_01.npy'), mode='w+',
+            dtype='float64' if task == 'regression' else 'int64',
+            shape=(n_samples,))
+        for start in range(0, n_samples, chunk_size):
+            stop = min(start + chunk_size, n_samples)
+            X_chunk = rng.randn(stop - start, n_features)
+            y_chunk = X_chunk.dot(coef) + rng.randn(stop - start)
+            X[start:stop] = X_chunk
+            y[start:stop] = (y_chunk if task == 'regression' else
+                             y_chunk > 0)
+            # write back the chunk, so that its pages can be evicted
+            X.flush()
+            y.flush()
+        del X, y
+
+    key = dict(n_samples=n_samples, n_features=n_features, task=task,
+               random_state=random_state)
+    return cached_array_files('out_of_core', key, write_arrays)
+
+
+class ChunkReader:
+    """iterate over the rows of memory-mapped .npy arrays by chunks
+
+    Each iteration yields a tuple with a chunk of each array, read with file
+    I/O into new in-memory arrays rather than sliced from the memory map: the
+    pages of the files are only held by the page cache, which the kernel can
+    evict, and the memory of the process stays bounded by the chunks. With
+    prefetch > 0, a background thread reads up to prefetch chunks ahead,
+    overlapping the I/O (which releases the GIL) with the computation on the
+    current chunk.
+    """
+    def __init__(self, arrays, chunk_size, prefetch=0):
+        for array in arrays:
+            if not (isinstance(array, np.memmap) and
+                    array.flags['C_CONTIGUOUS']):
+                raise ValueError(
+                    'ChunkReader needs C-contiguous memory-mapped arrays')
+        self.arrays = arrays
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+
+    def __len__(self):
+        return -(-len(self.arrays[0]) // self.chunk_size)
+
+    @staticmethod
+    def _read(f, array, start, stop):
+        chunk = np.empty((stop - start,) + array.shape[1:], dtype=array.dtype)
+        f.seek(array.offset + start * chunk.itemsize * int(np.prod(
+            array.shape[1:])))
+        buffer = memoryview(chunk).cast('B')
+        n_read = 0
+        while n_read < len(buffer):
+            n = f.readinto(buffer[n_read:])
+            if not n:
+                raise EOFError('{} is truncated'.format(array.filename))
+            n_read += n
+        return chunk
+
+    def _chunks(self):
+        files = [open(array.filename, 'rb', buffering=0)
+                 for array in self.arrays]
+        try:
+            n_samples = len(self.arrays[0])
+            for start in range(0, n_samples, self.chunk_size):
+                stop = min(start + self.chunk_size, n_samples)
+                yield tuple(self._read(f, array, start, stop)
+                            for f, array in zip(files, self.arrays))
+        finally:
+            for f in files:
+                f.close()
+
+    def _fill(self, chunks, stop_event):
+        # read chunks into the bounded queue until exhausted or stopped
+        import queue
+
+        def put(item):
+            while not stop_event.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            for chunk in self._chunks():
+                if not put(chunk):
+                    return
+        except BaseException as e:
+            put(e)
+            return
+        put(None)
+
+    def __iter__(self):
+        if not self.prefetch:
+            for chunk in self._chunks():
+                yield chunk
+            return
+
+        import queue
+        chunks = queue.Queue(maxsize=self.prefetch)
+        stop_event = threading.Event()
+        thread = threading.Thread(target=self._fill,
+                                  args=(chunks, stop_event), daemon=True)
+        thread.start()
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    return
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                yield chunk
+        finally:
+            stop_event.set()
+            thread.join()
+
+
+# When set, datasets that would otherwise be downloaded are replaced by
+# deterministic synthetic stand-ins, so that the suite can run without network
+OFFLINE = os.environ.get('SKLEARN_BENCHMARKS_OFFLINE', '0') not in ('', '0')
+
+# size and shape statistics of the real datasets, used by the synthetic
+# stand-ins (train subset of 20newsgroups, full California housing dataset)
+TWENTY_NEWSGROUPS_STATS = dict(
+    n_documents=11314, n_classes=20, vocabulary_size=130000,
+    zipf_exponent=1.05, median_length=180, length_sigma=1.0,
+    topic_size=500, topic_proportion=0.2)
+CALIFORNIA_HOUSING_STATS = dict(n_samples=20640, n_features=8)
+
+
+def _make_vocabulary(vocabulary_size):
+    # lowercase words, shorter words being more frequent. Words have at least
+    # two letters to be kept by the default TfidfVectorizer token_pattern
+    alphabet = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+    words = []
+    for i in range(vocabulary_size):
+        letters = []
+        i += 26
+        while i > 0:
+            i, r = divmod(i, 26)
+            letters.append(alphabet[r])
+        words.append(''.join(letters))
+    return np.array(words)
+
+
+def make_synthetic_20newsgroups(scale=1, random_state=0):
+    """generate a text classification dataset shaped like 20newsgroups
+
+    The number of documents is the one of the 20newsgroups train subset times
+    ``scale``. Tokens follow a Zipf distribution over the vocabulary, and each
+    class over-represents its own block of "topic" words, so that the
+    TfidfVectorizer+SGDClassifier pipeline has something to learn. Document
+    lengths are log-normally distributed. Returns a list of strings and an
+    array of integer targets.
+    """
+    stats = TWENTY_NEWSGROUPS_STATS
+    rng = np.random.RandomState(random_state)
+    n_documents = int(stats['n_documents'] * scale)
+    n_classes = stats['n_classes']
+    vocabulary = _make_vocabulary(stats['vocabulary_size'])
+
+    ranks = np.arange(1, len(vocabulary) + 1)
+    frequencies = ranks ** -stats['zipf_exponent']
+    frequencies /= frequencies.sum()
+
+    target = rng.randint(n_classes, size=n_documents)
+    lengths = rng.lognormal(np.log(stats['median_length']),
+                            stats['length_sigma'], size=n_documents)
+    lengths = np.maximum(lengths.astype(np.int64), 1)
+
+    # topic words are taken out of the mid-frequency range of the vocabulary
+    topic_start = 1000
+    topic_size = stats['topic_size']
+
+    tokens = rng.choice(len(vocabulary), size=lengths.sum(), p=frequencies)
+    doc_ids = np.repeat(np.arange(n_documents), lengths)
+    is_topic = rng.uniform(size=len(tokens)) < stats['topic_proportion']
+    tokens[is_topic] = (topic_start + target[doc_ids[is_topic]] * topic_size
+                        + rng.randint(topic_size, size=is_topic.sum()))
+
+    words = vocabulary[tokens]
+    boundaries = np.cumsum(lengths)[:-1]
+    data = [' '.join(doc) for doc in np.split(words, boundaries)]
+    return data, target
+
+
+def make_synthetic_california_housing(scale=1, random_state=0):
+    """generate a regression dataset shaped like California housing
+
+    The 8 features reproduce the ranges and skewness of the real ones (MedInc,
+    HouseAge, AveRooms, AveBedrms, Population, AveOccup, Latitude, Longitude)
+    and the target is a clipped, noisy function of them, in units of 100,000$
+    like MedHouseVal. The number of samples is the one of the real dataset
+    times ``scale``.
+    """
+    rng = np.random.RandomState(random_state)
+    n_samples = int(CALIFORNIA_HOUSING_STATS['n_samples'] * scale)
+
+    med_inc = np.clip(rng.lognormal(np.log(3.5), 0.45, n_samples), 0.5, 15)
+    house_age = rng.randint(1, 53, n_samples).astype(np.float64)
+    ave_rooms = np.clip(rng.lognormal(np.log(5.2), 0.25, n_samples),
+                        0.85, 141.9)
+    ave_bedrms = np.clip(rng.lognormal(np.log(1.05), 0.1, n_samples),
+                         0.33, 34.1)
+    population = np.clip(rng.lognormal(np.log(1166), 0.75, n_samples),
+                         3, 35682)
+    ave_occup = np.clip(rng.lognormal(np.log(2.8), 0.3, n_samples),
+                        0.69, 1243.3)
+    latitude = np.clip(rng.normal(35.6, 2.1, n_samples), 32.54, 41.95)
+    # the coast line runs roughly along longitude = -latitude - 84
+    longitude = np.clip(-latitude - 84 + rng.normal(0, 0.8, n_samples),
+                        -124.35, -114.31)
+
+    X = np.column_stack([med_inc, house_age, ave_rooms, ave_bedrms,
+                         population, ave_occup, latitude, longitude])
+    y = (0.42 * med_inc + 0.01 * house_age - 0.4 * (latitude - 34)
+         - 0.05 * ave_occup + rng.normal(0, 0.7, n_samples))
+    y = np.clip(y, 0.15, 5.00001)
+    return X, y
+
+
+def load_20newsgroups(scale=1):
+    """return the 20newsgroups (data, target), or a synthetic stand-in
+
+    The real dataset is fetched only if the suite is not run offline and
+    ``scale`` is 1. The synthetic documents are generated once and cached as
+    the bytes of their newline-separated text: at scale 100, generating them
+    in every setup would take most of the benchmark timeout.
+    """
+    if OFFLINE or scale != 1:
+        def make_arrays():
+            data, target = make_synthetic_20newsgroups(scale=scale)
+            text = '\n'.join(data).encode('ascii')
+            return np.frombuffer(text, dtype=np.uint8), target
+        text, target = cached_arrays('make_synthetic_20newsgroups',
+                                     dict(scale=scale, random_state=0),
+                                     make_arrays)
+        return text.tobytes().decode('ascii').split('\n'), target
+
+    from sklearn.datasets import fetch_20newsgroups
+    data = fetch_20newsgroups()
+    return data.data, data.target
+
+
+def load_california_housing(scale=1):
+    """return memory-mapped California housing (X, y), or a stand-in
+
+    The real dataset is fetched only if the suite is not run offline and
+    ``scale`` is 1.
+    """
+    if OFFLINE or scale != 1:
+        def make_arrays():
+            return make_synthetic_california_housing(scale=scale)
+        return cached_arrays('make_synthetic_california_housing',
+                             dict(scale=scale, random_state=0), make_arrays)
+
+    def fetch_arrays():
+        from sklearn.datasets import fetch_california_housing
+        data = fetch_california_housing()
+        return data.data, data.target
+
+    return cached_arrays('fetch_california_housing', {}, fetch_arrays)
+
+
+def n_rotation_slots(total_cost, budget):
+    """number of nights needed to run work of total_cost within a budget"""
+    return max(1, int(math.ceil(total_cost / budget)))
+
+
+def rotation_slot():
+    """the rotation slot of the current run
+
+    The slot must be the same in every process of a run, and for every
+    commit of a run: asv discovers the parameters of the benchmarks once, and
+    maps their indices to their values in each benchmark process. It is
+    therefore only chosen by ROTATION, set once by the driver of the run, and
+    is 0 by default.
+    """
+    return int(ROTATION) if ROTATION else 0
+
+
+def rotating_subset(costs, n_slots, slot):
+    """return the keys of costs scheduled in a slot of a rotation
+
+    The keys of the costs dict (for instance estimator names) are split into
+    n_slots groups of similar total cost, using the longest processing time
+    first heuristic. The groups are deterministic, so that running every slot
+    in turn covers all the keys.
+    """
+    n_slots = max(1, min(n_slots, len(costs)))
+    slot = slot % n_slots
+
+    slot_costs = [0] * n_slots
+    slot_keys = [[] for _ in range(n_slots)]
+    for key in sorted(costs, key=lambda k: (-costs[k], str(k))):
+        lightest_slot = slot_costs.index(min(slot_costs))
+        slot_costs[lightest_slot] += costs[key]
+        slot_keys[lightest_slot].append(key)
+    return sorted(slot_keys[slot])
+
+
+def scheduled_estimators(n_fits_per_estimator):
+    """the regressors, classifiers and transformers to benchmark in this run
+
+    Each estimator family is split over the same number of rotation slots,
+    sized so that running n_fits_per_estimator fits of the estimators of one
+    slot fits into the nightly time budget (see ROTATION in config.py).
+    n_fits_per_estimator is either a number, or a function returning the
+    number of fits (or equivalent work) of an estimator given its name.
+    """
+    if not callable(n_fits_per_estimator):
+        n_fits = n_fits_per_estimator
+
+        def n_fits_per_estimator(name):
+            return n_fits
+
+    families = [ALL_REGRESSORS, ALL_CLASSIFIERS, ALL_TRANSFORMERS]
+    names = [sorted(name for name in estimators
+                    if name not in UNSUPPORTED_ESTIMATORS)
+             for estimators in families]
+    if ROTATION == 'all':
+        return names
+
+    costs = [{name: n_fits_per_estimator(name) * EXPECTED_FIT_TIME
+              for name in family_names} for family_names in names]
+    total_cost = sum(sum(family_costs.values()) for family_costs in costs)
+    n_slots = n_rotation_slots(total_cost, NIGHTLY_TIME_BUDGET)
+    slot = rotation_slot()
+    return [rotating_subset(family_costs, n_slots, slot)
+            for family_costs in costs]
+
+
+def make_estimator_dataset(estimator_name, generator, n_samples, n_features,
+                           random_state=0, dtype='float64', order='C'):
+    """make_cached_dataset, adapted to the input an estimator accepts"""
+    # For multitask estimators, generate multi-dimensional output
+    n_targets = 4 if 'MultiTask' in estimator_name else 1
+
+    X, y = make_cached_dataset(generator, n_samples, n_features,
+                               n_targets=n_targets, random_state=random_state,
+                               dtype=dtype, order=order)
+    if estimator_name in NON_NEGATIVE_ESTIMATORS:
+        X = np.abs(X, order='K')
+    return X, y
+
+
+def cached_fitted_estimator(estimator, X, y, key):
+    """fit estimator on (X, y), or load it from the cache if already fitted
+
+    key is a dict identifying the estimator and its training data. Fitted
+    estimators are persisted with joblib, and are only reused with the same
+    scikit-learn version.
+    """
+    import joblib
+    import sklearn
+
+    key = dict(key, sklearn_version=sklearn.__version__)
+    digest = hashlib.sha1(
+        repr(sorted(key.items())).encode('utf-8')).hexdigest()[:16]
+    cache_dir = os.path.join(CACHE_DIR, 'fitted_estimators')
+    path = os.path.join(cache_dir, '{}.pkl'.format(digest))
+    if os.path.exists(path):
+        return joblib.load(path)
+
+    estimator.fit(X, y)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = '{}.tmp-{}'.format(path, os.getpid())
+    joblib.dump(estimator, tmp_path)
+    os.replace(tmp_path, path)
+    return estimator
 
 
 def clone_and_fit(estimator, X, y):
@@ -49,16 +577,145 @@ def clone_and_fit(estimator, X, y):
     cloned_estimator.fit(X, y)
 
 
+def _cpu_model():
+    if os.path.exists('/proc/cpuinfo'):
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    return platform.processor()
+
+
+def _numa_nodes():
+    # cpu list of each NUMA node, Linux only
+    node_dir = '/sys/devices/system/node'
+    nodes = {}
+    if os.path.isdir(node_dir):
+        for name in sorted(os.listdir(node_dir)):
+            if name.startswith('node') and name[4:].isdigit():
+                with open(os.path.join(node_dir, name, 'cpulist')) as f:
+                    nodes[name] = f.read().strip()
+    return nodes
+
+
+def machine_fingerprint():
+    """describe the hardware and the software the benchmarks run on
+
+    The hardware part holds the cpu model, the number of physical and logical
+    cores and the NUMA topology, the software part the versions of Python,
+    numpy, scikit-learn, joblib and loky, and the BLAS libraries loaded with
+    their number of threads (requires threadpoolctl). ``id`` is a hash of
+    both, identifying the runs that can be compared directly.
+    """
+    import joblib
+    import psutil
+    import sklearn
+    from joblib.externals import loky
+
+    try:
+        from threadpoolctl import threadpool_info
+        blas = [{k: info.get(k) for k in ['internal_api', 'version',
+                                          'num_threads', 'threading_layer']}
+                for info in threadpool_info()]
+    except ImportError:
+        blas = None
+
+    fingerprint = dict(
+        hardware=dict(cpu_model=_cpu_model(),
+                      n_physical_cores=psutil.cpu_count(logical=False),
+                      n_logical_cores=os.cpu_count(),
+                      numa_nodes=_numa_nodes()),
+        software=dict(python=platform.python_version(),
+                      numpy=np.__version__, sklearn=sklearn.__version__,
+                      joblib=joblib.__version__, loky=loky.__version__,
+                      blas=blas))
+    fingerprint['id'] = hashlib.sha1(json.dumps(
+        fingerprint, sort_keys=True).encode()).hexdigest()[:12]
+    return fingerprint
+
+
+def measure_memory_bandwidth(n_bytes=2 ** 28, n_repeat=5):
+    """memory bandwidth of a single core, in bytes per second
+
+    Best of n_repeat copies of an array of n_bytes, counting the bytes read
+    and written.
+    """
+    src = np.ones(n_bytes // 8)
+    dst = np.empty_like(src)
+    best = float('inf')
+    for _ in range(n_repeat):
+        t0 = timeit.default_timer()
+        np.copyto(dst, src)
+        best = min(best, timeit.default_timer() - t0)
+    return 2 * n_bytes / best
+
+
+def calibration_kernel(src, dst, n_iter=1000000):
+    """fixed single-threaded workload used to normalize timings across hosts
+
+    It combines a memory bound copy of src into dst and a pure Python loop,
+    as the benchmarks spend their time in both.
+    """
+    np.copyto(dst, src)
+    total = 0
+    for i in range(n_iter):
+        total += i
+    return total
+
+
+def asv_machine_name():
+    """name of the machine the results of the current run are stored under
+
+    ASV_MACHINE if set (by orchestrate.py for instance), else the machine
+    asv uses by default: the only one of ~/.asv-machine.json, or the
+    hostname.
+    """
+    if os.environ.get('ASV_MACHINE'):
+        return os.environ['ASV_MACHINE']
+    path = os.path.join(os.path.expanduser('~'), '.asv-machine.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            machines = [name for name in json.load(f) if name != 'version']
+        if len(machines) == 1:
+            return machines[0]
+    return socket.gethostname()
+
+
+def write_fingerprint(fingerprint):
+    """record the fingerprint of the current asv run in FINGERPRINT_DIR
+
+    Fingerprints are keyed by machine, commit and environment, read from the
+    variables asv sets in the benchmark processes; nothing is written outside
+    of asv runs. The machine is the asv machine name, so that they match the
+    results of the run.
+    """
+    commit_hash = os.environ.get('ASV_COMMIT')
+    env_name = os.environ.get('ASV_ENV_NAME')
+    if commit_hash is None or env_name is None:
+        return None
+    machine_dir = os.path.join(FINGERPRINT_DIR, asv_machine_name())
+    os.makedirs(machine_dir, exist_ok=True)
+    path = os.path.join(machine_dir, '{}-{}.json'.format(commit_hash[:8],
+                                                         env_name))
+    with open(path + '.tmp', 'w') as f:
+        json.dump(dict(fingerprint, commit_hash=commit_hash,
+                       env_name=env_name), f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+    return path
+
+
 class SklearnBenchmark:
     processes = 1
     number = 1
-    repeat = 1
-    warmup_time = 0
+    repeat = REPEAT
+    warmup_time = WARMUP_TIME
     timer = timeit.default_timer
     timeout = 120
 
     # non-asv class attributes
     n_tasks = 10
+    # memory metric reported by with_memory_tracking: 'rss', 'uss' or 'pss'
+    memory_metric = 'pss'
 
     def setup(self, backend, pickler):
         # tell scikit-learn where to look for joblib
@@ -66,6 +723,806 @@ class SklearnBenchmark:
                 os.environ['ASV_ENV_DIR'], 'project')
         os.environ['LOKY_PICKLER'] = pickler
 
+        if TRACE_DIR:
+            self._tracer = TaskTracer().__enter__()
+
+    def teardown(self, *params):
+        # write the timeline of the tasks run since setup, see TRACE_DIR
+        tracer = getattr(self, '_tracer', None)
+        if tracer is None:
+            return
+        tracer.__exit__(None, None, None)
+        self._tracer = None
+
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        name = '_'.join([type(self).__name__] + [str(p) for p in params] +
+                        [str(int(time.time() * 1000)), str(os.getpid())])
+        metadata = dict(benchmark=type(self).__name__,
+                        param_names=getattr(self, 'param_names', []),
+                        params=[str(p) for p in params])
+        tracer.export_chrome_trace(
+            os.path.join(TRACE_DIR, name + '.trace.json'), metadata=metadata)
+        with open(os.path.join(TRACE_DIR, name + '.summary.json'), 'w') as f:
+            json.dump(dict(metadata, **tracer.summary()), f, indent=2)
+
+    @staticmethod
+    def scale_n_samples(n_samples, n_jobs, scaling):
+        """number of samples to use for a given scaling mode
+
+        In strong scaling mode, the problem size is fixed whatever the number
+        of workers. In weak scaling mode, it grows proportionally to n_jobs,
+        so that the amount of work per worker stays constant.
+        """
+        if scaling == 'strong':
+            return n_samples
+        elif scaling == 'weak':
+            return n_samples * n_jobs
+        raise ValueError(
+            "scaling should be 'strong' or 'weak', got {}".format(scaling))
+
+
+def _get_pickler_functions(pickler):
+    if pickler == 'cloudpickle':
+        try:
+            from joblib.externals import cloudpickle
+        except ImportError:
+            import cloudpickle
+        return cloudpickle.dumps, pickle.loads
+
+    def dumps(obj):
+        try:
+            return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            # loky falls back to cloudpickle for objects pickle cannot handle
+            # (lambdas, interactively defined functions...)
+            return _get_pickler_functions('cloudpickle')[0](obj)
+    return dumps, pickle.loads
+
+
+class SerializationTracker:
+    """record the serialization cost of the tasks dispatched by joblib
+
+    When used as a context manager, the batches of tasks dispatched by all the
+    Parallel calls, and the results they return, are serialized and
+    deserialized once more with the given pickler, to measure the number of
+    bytes sent to and from the workers and the time spent in dumps and loads
+    on each side: tasks are dumped by the parent and loaded by the workers,
+    results are dumped by the workers and loaded by the parent. Backends
+    sharing memory with the parent (threading, or any backend falling back to
+    sequential execution) do not serialize anything and are not recorded.
+
+    This doubles the serialization work, and should therefore only be used
+    outside of timed benchmarks.
+    """
+    def __init__(self, pickler):
+        self.pickler = pickler
+        self.n_tasks = 0
+        self.n_batches = 0
+        self.task_bytes = 0
+        self.result_bytes = 0
+        self.task_dumps_time = 0.
+        self.task_loads_time = 0.
+        self.result_dumps_time = 0.
+        self.result_loads_time = 0.
+
+    @property
+    def serialized_bytes(self):
+        return self.task_bytes + self.result_bytes
+
+    @property
+    def parent_time(self):
+        return self.task_dumps_time + self.result_loads_time
+
+    @property
+    def worker_time(self):
+        return self.task_loads_time + self.result_dumps_time
+
+    def _measure(self, obj):
+        dumps, loads = _get_pickler_functions(self.pickler)
+        t0 = timeit.default_timer()
+        payload = dumps(obj)
+        t1 = timeit.default_timer()
+        loads(payload)
+        t2 = timeit.default_timer()
+        return len(payload), t1 - t0, t2 - t1
+
+    def _record_batch(self, batch):
+        n_bytes, dumps_time, loads_time = self._measure(batch)
+        self.n_batches += 1
+        self.n_tasks += len(batch)
+        self.task_bytes += n_bytes
+        self.task_dumps_time += dumps_time
+        self.task_loads_time += loads_time
+
+    def _record_results(self, results):
+        for result in results:
+            n_bytes, dumps_time, loads_time = self._measure(result)
+            self.result_bytes += n_bytes
+            self.result_dumps_time += dumps_time
+            self.result_loads_time += loads_time
+
+    def __enter__(self):
+        from joblib.parallel import Parallel
+        self._original_dispatch = Parallel._dispatch
+        self._original_call = Parallel.__call__
+        tracker = self
+
+        def _dispatch(parallel, batch):
+            if not getattr(parallel._backend, 'supports_sharedmem', False):
+                tracker._record_batch(batch)
+            return tracker._original_dispatch(parallel, batch)
+
+        def __call__(parallel, iterable):
+            output = tracker._original_call(parallel, iterable)
+            if not getattr(parallel._backend, 'supports_sharedmem', False):
+                tracker._record_results(output)
+            return output
+
+        Parallel._dispatch = _dispatch
+        Parallel.__call__ = __call__
+        return self
+
+    def __exit__(self, *exc_info):
+        from joblib.parallel import Parallel
+        Parallel._dispatch = self._original_dispatch
+        Parallel.__call__ = self._original_call
+
+
+class BatchSizeRecorder:
+    """record the size of the batches of tasks dispatched by joblib
+
+    When used as a context manager, every batch dispatched by a Parallel call
+    is appended to ``history`` as a (seconds since entering, batch size)
+    tuple, which shows how the 'auto' batching strategy adapts the batch size
+    over time.
+    """
+    def __init__(self):
+        self.history = []
+
+    @property
+    def batch_sizes(self):
+        return [batch_size for _, batch_size in self.history]
+
+    def __enter__(self):
+        from joblib.parallel import Parallel
+        self._original_dispatch = Parallel._dispatch
+        self._start = timeit.default_timer()
+        recorder = self
+
+        def _dispatch(parallel, batch):
+            recorder.history.append(
+                (timeit.default_timer() - recorder._start, len(batch)))
+            return recorder._original_dispatch(parallel, batch)
+
+        Parallel._dispatch = _dispatch
+        return self
+
+    def __exit__(self, *exc_info):
+        from joblib.parallel import Parallel
+        Parallel._dispatch = self._original_dispatch
+
+
+# state of the instrumentation of check_array by ArrayCopyTracker: the number
+# of active trackers in the process, and the stack of trackers of each thread
+_copy_tracking_lock = threading.Lock()
+_copy_tracking_state = dict(n_trackers=0, check_array=None)
+_copy_tracking_local = threading.local()
+
+
+def _copy_tracking_check_array(array, *args, **kwargs):
+    result = _copy_tracking_state['check_array'](array, *args, **kwargs)
+    trackers = getattr(_copy_tracking_local, 'trackers', None)
+    if (trackers and isinstance(array, np.ndarray) and
+            isinstance(result, np.ndarray) and
+            not np.may_share_memory(array, result)):
+        for tracker in trackers:
+            tracker.n_copies += 1
+            tracker.copied_bytes += result.nbytes
+    return result
+
+
+class ArrayCopyTracker:
+    """count the copies of input arrays made by sklearn's input validation
+
+    When used as a context manager, check_array (also used by check_X_y) is
+    instrumented in all the imported sklearn modules, and every call made from
+    the current thread that returns an array not sharing memory with its input
+    array (because of a dtype conversion, a change of memory layout, a
+    read-only memmap...) is counted in n_copies and copied_bytes.
+
+    Only the calls of the process entering the tracker are seen, so trackers
+    of process-based backends have to be entered in the workers, see
+    clone_and_fit_tracking_copies. Modules imported while the tracker is
+    active are not instrumented.
+    """
+    def __init__(self):
+        self.n_copies = 0
+        self.copied_bytes = 0
+
+    @staticmethod
+    def _patch_modules(old, new):
+        for name, module in list(sys.modules.items()):
+            if (name.startswith('sklearn') and module is not None and
+                    getattr(module, 'check_array', None) is old):
+                setattr(module, 'check_array', new)
+
+    def __enter__(self):
+        with _copy_tracking_lock:
+            if _copy_tracking_state['n_trackers'] == 0:
+                from sklearn.utils import validation
+                _copy_tracking_state['check_array'] = validation.check_array
+                self._patch_modules(validation.check_array,
+                                    _copy_tracking_check_array)
+            _copy_tracking_state['n_trackers'] += 1
+        if not hasattr(_copy_tracking_local, 'trackers'):
+            _copy_tracking_local.trackers = []
+        _copy_tracking_local.trackers.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _copy_tracking_local.trackers.remove(self)
+        with _copy_tracking_lock:
+            _copy_tracking_state['n_trackers'] -= 1
+            if _copy_tracking_state['n_trackers'] == 0:
+                self._patch_modules(_copy_tracking_check_array,
+                                    _copy_tracking_state['check_array'])
+
+
+def clone_and_fit_tracking_copies(estimator, X, y):
+    """clone_and_fit, returning the number and bytes of input copies made"""
+    with ArrayCopyTracker() as tracker:
+        clone_and_fit(estimator, X, y)
+    return tracker.n_copies, tracker.copied_bytes
+
+
+class _PeriodicSampler:
+    # context manager calling self.sample every interval seconds from a
+    # background thread, and once when entering and exiting
+    def __init__(self, interval):
+        self.interval = interval
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop_event.set()
+        self._thread.join()
+        self.sample()
+
+
+class _TracedBatch:
+    # wraps a batch of tasks dispatched by joblib to record, in the worker,
+    # when and where it runs. Events are appended to a file per process, as
+    # the return value of the batch cannot be changed
+    def __init__(self, batch, batch_id, trace_dir):
+        self.batch = batch
+        self.batch_id = batch_id
+        self.trace_dir = trace_dir
+
+    def __call__(self, *args, **kwargs):
+        start = time.time()
+        try:
+            return self.batch(*args, **kwargs)
+        finally:
+            end = time.time()
+            event = dict(batch_id=self.batch_id, pid=os.getpid(),
+                         tid=threading.get_ident(), start=start, end=end)
+            path = os.path.join(self.trace_dir,
+                                'worker-{}.jsonl'.format(os.getpid()))
+            with open(path, 'a') as f:
+                f.write(json.dumps(event) + '\n')
+
+    def __len__(self):
+        return len(self.batch)
+
+    def __getattr__(self, name):
+        # delegate the other attributes (batch_size, items...) to the batch
+        if name.startswith('__') or name == 'batch':
+            raise AttributeError(name)
+        return getattr(self.batch, name)
+
+
+class TaskTracer:
+    """record a timeline of the batches of tasks dispatched by joblib
+
+    When used as a context manager, every batch dispatched by a Parallel call
+    is recorded with its dispatch time, the process and thread of the worker
+    running it, its start and end times, the time its result is collected by
+    the parent, and (for backends not sharing memory with the parent) the
+    size of its payload once pickled. export_chrome_trace writes the timeline
+    in the Chrome trace format, which Perfetto and chrome://tracing can open,
+    and summary computes the utilization of the workers.
+    """
+    def __init__(self, measure_payloads=True):
+        self.measure_payloads = measure_payloads
+        self.batches = {}
+        self.worker_events = []
+        self._local = threading.local()
+        self._next_batch_id = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        import tempfile
+        from joblib.parallel import BatchCompletionCallBack, Parallel
+
+        self._trace_dir = tempfile.mkdtemp(prefix='joblib_trace_')
+        self._original_dispatch = Parallel._dispatch
+        self._original_callback_init = BatchCompletionCallBack.__init__
+        self._original_callback_call = BatchCompletionCallBack.__call__
+        tracer = self
+
+        def _dispatch(parallel, batch):
+            with tracer._lock:
+                batch_id = tracer._next_batch_id
+                tracer._next_batch_id += 1
+            payload_bytes = None
+            shared_memory = getattr(parallel._backend, 'supports_sharedmem',
+                                    False)
+            if tracer.measure_payloads and not shared_memory:
+                dumps, _ = _get_pickler_functions('cloudpickle')
+                payload_bytes = len(dumps(batch))
+            tracer.batches[batch_id] = dict(
+                n_tasks=len(batch), dispatch=time.time(), collect=None,
+                parent_pid=os.getpid(), parent_tid=threading.get_ident(),
+                payload_bytes=payload_bytes)
+            # the completion callback is created by _dispatch in this thread
+            tracer._local.batch_id = batch_id
+            try:
+                return tracer._original_dispatch(
+                    parallel, _TracedBatch(batch, batch_id,
+                                           tracer._trace_dir))
+            finally:
+                tracer._local.batch_id = None
+
+        def callback_init(callback, *args, **kwargs):
+            tracer._original_callback_init(callback, *args, **kwargs)
+            callback._traced_batch_id = getattr(tracer._local, 'batch_id',
+                                                None)
+
+        def callback_call(callback, *args, **kwargs):
+            batch_id = getattr(callback, '_traced_batch_id', None)
+            if batch_id is not None:
+                tracer.batches[batch_id]['collect'] = time.time()
+            return tracer._original_callback_call(callback, *args, **kwargs)
+
+        Parallel._dispatch = _dispatch
+        BatchCompletionCallBack.__init__ = callback_init
+        BatchCompletionCallBack.__call__ = callback_call
+        return self
+
+    def __exit__(self, *exc_info):
+        import shutil
+        from joblib.parallel import BatchCompletionCallBack, Parallel
+
+        Parallel._dispatch = self._original_dispatch
+        BatchCompletionCallBack.__init__ = self._original_callback_init
+        BatchCompletionCallBack.__call__ = self._original_callback_call
+
+        for filename in os.listdir(self._trace_dir):
+            with open(os.path.join(self._trace_dir, filename)) as f:
+                self.worker_events.extend(json.loads(line) for line in f)
+        shutil.rmtree(self._trace_dir, ignore_errors=True)
+
+    def summary(self):
+        """utilization and idle time of the workers over the traced period
+
+        The traced period goes from the first dispatch to the last result
+        collection. A worker is a (pid, thread) pair that ran at least one
+        batch.
+        """
+        if not self.worker_events:
+            return dict(n_batches=len(self.batches), n_workers=0)
+        workers = {(e['pid'], e['tid']) for e in self.worker_events}
+        begin = min(b['dispatch'] for b in self.batches.values())
+        end = max([b['collect'] or 0 for b in self.batches.values()] +
+                  [e['end'] for e in self.worker_events])
+        span = end - begin
+        busy_time = sum(e['end'] - e['start'] for e in self.worker_events)
+        durations = sorted(e['end'] - e['start'] for e in self.worker_events)
+        return dict(
+            n_batches=len(self.batches),
+            n_tasks=sum(b['n_tasks'] for b in self.batches.values()),
+            n_workers=len(workers),
+            span=span,
+            busy_time=busy_time,
+            idle_time=len(workers) * span - busy_time,
+            utilization=busy_time / (len(workers) * span) if span else 0.,
+            # ratio of the slowest batch to the median one
+            straggler_ratio=durations[-1] / durations[len(durations) // 2]
+            if durations[len(durations) // 2] else 0.,
+            payload_bytes=sum(b['payload_bytes'] or 0
+                              for b in self.batches.values()))
+
+    def export_chrome_trace(self, path, metadata=None):
+        """write the timeline to path in the Chrome trace event format"""
+        def us(t):
+            return t * 1e6
+
+        events = []
+        for e in self.worker_events:
+            batch = self.batches.get(e['batch_id'], {})
+            args = dict(batch, batch_id=e['batch_id'])
+            if batch:
+                args['queue_delay'] = e['start'] - batch['dispatch']
+            events.append(dict(
+                name='batch', cat='task', ph='X', ts=us(e['start']),
+                dur=us(e['end'] - e['start']), pid=e['pid'], tid=e['tid'],
+                args=args))
+            if batch:
+                # arrow from the dispatch to the start of the batch
+                events.append(dict(
+                    name='dispatch', cat='dispatch', ph='s',
+                    id=e['batch_id'], ts=us(batch['dispatch']),
+                    pid=batch['parent_pid'], tid=batch['parent_tid']))
+                events.append(dict(
+                    name='dispatch', cat='dispatch', ph='f', bp='e',
+                    id=e['batch_id'], ts=us(e['start']), pid=e['pid'],
+                    tid=e['tid']))
+
+        for batch_id, batch in self.batches.items():
+            events.append(dict(
+                name='dispatch', cat='parent', ph='i', s='t',
+                ts=us(batch['dispatch']), pid=batch['parent_pid'],
+                tid=batch['parent_tid'], args=dict(batch_id=batch_id)))
+            if batch['collect'] is not None:
+                events.append(dict(
+                    name='collect', cat='parent', ph='i', s='t',
+                    ts=us(batch['collect']), pid=batch['parent_pid'],
+                    tid=batch['parent_tid'], args=dict(batch_id=batch_id)))
+
+        trace = dict(traceEvents=events, displayTimeUnit='ms',
+                     otherData=dict(metadata or {}, summary=self.summary()))
+        with open(path, 'w') as f:
+            json.dump(trace, f)
+
+
+class MemorySampler(_PeriodicSampler):
+    """sample the memory used by the current process and all its children
+
+    When used as a context manager, a background thread polls the memory of
+    the current process and of all its descendants (the workers of
+    process-based backends) every ``interval`` seconds. For each metric among
+    rss, uss and pss (the last two being only available on some platforms),
+    ``peak_total`` holds the peak of the sum over all processes, and
+    ``peak_per_worker`` the peak of the largest worker. When there is no child
+    process (threading backend), the current process is considered as the
+    worker. Values are in bytes. Requires psutil.
+    """
+    metrics = ('rss', 'uss', 'pss')
+
+    def __init__(self, interval=0.1):
+        super(MemorySampler, self).__init__(interval)
+        self.peak_total = dict.fromkeys(self.metrics, 0)
+        self.peak_per_worker = dict.fromkeys(self.metrics, 0)
+
+    def _memory_info(self, process):
+        import psutil
+        try:
+            info = process.memory_full_info()
+        except psutil.AccessDenied:
+            info = process.memory_info()
+        return {m: getattr(info, m, 0) for m in self.metrics}
+
+    def sample(self):
+        import psutil
+        total = dict.fromkeys(self.metrics, 0)
+        workers = self._process.children(recursive=True)
+        for process in [self._process] + workers:
+            try:
+                info = self._memory_info(process)
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                # the worker exited between the listing and the sampling
+                continue
+            for m in self.metrics:
+                total[m] += info[m]
+                if process in workers or not workers:
+                    self.peak_per_worker[m] = max(self.peak_per_worker[m],
+                                                  info[m])
+        for m in self.metrics:
+            self.peak_total[m] = max(self.peak_total[m], total[m])
+
+    def __enter__(self):
+        import psutil
+        self._process = psutil.Process()
+        return super(MemorySampler, self).__enter__()
+
+
+class RunnableThreadsSampler(_PeriodicSampler):
+    """sample the number of runnable threads per core of the machine
+
+    When used as a context manager, a background thread polls the number of
+    threads that are running or waiting for a cpu (procs_running in
+    /proc/stat, so Linux only), divided by the number of cpus. A value above
+    1 means that the cpus are oversubscribed. ``mean`` and ``peak`` hold the
+    average and the maximum of the sampled values.
+    """
+    def __init__(self, interval=0.05):
+        super(RunnableThreadsSampler, self).__init__(interval)
+        self.samples = []
+
+    @property
+    def mean(self):
+        return sum(self.samples) / len(self.samples)
+
+    @property
+    def peak(self):
+        return max(self.samples)
+
+    def sample(self):
+        with open('/proc/stat') as f:
+            for line in f:
+                if line.startswith('procs_running'):
+                    # do not count the sampling thread itself
+                    n_running = int(line.split()[1]) - 1
+                    break
+        self.samples.append(n_running / os.cpu_count())
+
+    def __enter__(self):
+        if not os.path.exists('/proc/stat'):
+            raise NotImplementedError(
+                'sampling runnable threads requires /proc/stat')
+        return super(RunnableThreadsSampler, self).__enter__()
+
+
+class PageFaultSampler(_PeriodicSampler):
+    """sample the page faults of the child processes of the current process
+
+    When used as a context manager, a background thread reads every
+    ``interval`` seconds the number of minor and major page faults of all
+    the descendants of the current process since they started (in /proc, so
+    Linux only). ``page_faults`` maps the pid of each process seen to its
+    last sampled (minor, major) page faults: the faults of a process exiting
+    between two samples are underestimated. Requires psutil.
+    """
+    def __init__(self, interval=0.01):
+        super(PageFaultSampler, self).__init__(interval)
+        self.page_faults = {}
+
+    def sample(self):
+        for process in self._process.children(recursive=True):
+            try:
+                with open('/proc/{}/stat'.format(process.pid)) as f:
+                    # the fields following the parenthesized process name
+                    fields = f.read().rpartition(')')[2].split()
+            except OSError:
+                # the process exited since the listing
+                continue
+            self.page_faults[process.pid] = (int(fields[7]), int(fields[9]))
+
+    def __enter__(self):
+        if not os.path.exists('/proc/self/stat'):
+            raise NotImplementedError(
+                'sampling page faults requires /proc/<pid>/stat')
+        import psutil
+        self._process = psutil.Process()
+        return super(PageFaultSampler, self).__enter__()
+
+
+def _native_thread_id():
+    # the thread id of the kernel, threading.get_native_id on Python >= 3.8
+    get_native_id = getattr(threading, 'get_native_id', None)
+    if get_native_id is not None:
+        return get_native_id()
+    import ctypes
+    SYS_gettid = 186  # x86_64
+    return ctypes.CDLL(None).syscall(SYS_gettid)
+
+
+def _thread_cpu_clock(tid):
+    # clock id of the cpu time of a thread of the current process, as
+    # pthread_getcpuclockid returns it on Linux. Unlike se.sum_exec_runtime
+    # in /proc/<tid>/schedstat, only updated at scheduler ticks and context
+    # switches, reading it includes the current timeslice of the thread
+    return ((~tid) << 3) | 6
+
+
+class GILContentionProfiler(_PeriodicSampler):
+    """profile the GIL contention of the tasks run by the threading backend
+
+    When used as a context manager, every batch of tasks run in the current
+    process records its wall and cpu time in the thread running it, and a
+    background thread samples the threads running a batch every ``interval``
+    seconds (by default, the switch interval of the interpreter). Once it
+    has the GIL, the sampling thread keeps it for ``window`` seconds and
+    reads the cpu time clocks of these threads (Linux only) before and after:
+    a thread whose cpu time increased meanwhile runs native code which
+    released the GIL, the others hold no GIL and wait for it (or for I/O).
+    The clocks are exact at any time, so the window can be shorter than a
+    scheduler tick.
+    The sampling thread needs a cpu of its own, the measure is biased on an
+    oversubscribed machine.
+
+    ``native_fraction`` is the fraction of the samples in native code, and
+    ``gil_bound_fraction`` its complement: the fraction of the time the
+    workers hold or wait for the GIL. ``gil_wait_fraction`` is the part of
+    the time of the batches not spent on a cpu, estimated from the cpu times.
+    Batches run in worker processes are not seen.
+    """
+    def __init__(self, interval=None, window=5e-4):
+        if interval is None:
+            interval = sys.getswitchinterval()
+        super(GILContentionProfiler, self).__init__(interval)
+        self.window = window
+        self.n_native_samples = 0
+        self.n_samples = 0
+        self.wall_time = 0.
+        self.cpu_time = 0.
+        self._active_threads = set()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def native_fraction(self):
+        if self.n_samples == 0:
+            return float('nan')
+        return self.n_native_samples / self.n_samples
+
+    @property
+    def gil_bound_fraction(self):
+        return 1 - self.native_fraction
+
+    @property
+    def gil_wait_fraction(self):
+        if self.wall_time == 0:
+            return float('nan')
+        return max(0., 1 - self.cpu_time / self.wall_time)
+
+    @staticmethod
+    def _cpu_times(tids):
+        # time spent on a cpu by each thread, in seconds
+        cpu_times = {}
+        for tid in tids:
+            try:
+                cpu_times[tid] = time.clock_gettime(_thread_cpu_clock(tid))
+            except OSError:
+                # the thread exited
+                continue
+        return cpu_times
+
+    def sample(self):
+        tids = list(self._active_threads)
+        if not tids:
+            return
+        # no other thread can run Python code until the end of the window,
+        # which is shorter than the switch interval
+        before = self._cpu_times(tids)
+        deadline = time.perf_counter() + self.window
+        while time.perf_counter() < deadline:
+            pass
+        after = self._cpu_times(tids)
+        for tid, cpu_time in before.items():
+            if tid in after:
+                self.n_samples += 1
+                self.n_native_samples += after[tid] > cpu_time
+
+    def __enter__(self):
+        # the clock of the current thread must match its own cpu time, which
+        # is never 0 once the interpreter runs
+        try:
+            cpu_time = time.clock_gettime(
+                _thread_cpu_clock(_native_thread_id()))
+        except (AttributeError, OSError):
+            cpu_time = 0.
+        if not 0 < cpu_time <= time.clock_gettime(
+                time.CLOCK_THREAD_CPUTIME_ID):
+            raise NotImplementedError(
+                'profiling GIL contention requires Linux thread cpu clocks')
+        from joblib.parallel import BatchedCalls
+
+        self._original_call = BatchedCalls.__call__
+        profiler = self
+
+        def call(batch, *args, **kwargs):
+            if getattr(profiler._local, 'in_batch', False):
+                # nested batches run sequentially in the outer batch thread
+                return profiler._original_call(batch, *args, **kwargs)
+            clock = time.CLOCK_THREAD_CPUTIME_ID
+            tid = _native_thread_id()
+            profiler._local.in_batch = True
+            profiler._active_threads.add(tid)
+            start, cpu_start = time.perf_counter(), time.clock_gettime(clock)
+            try:
+                return profiler._original_call(batch, *args, **kwargs)
+            finally:
+                wall = time.perf_counter() - start
+                cpu = time.clock_gettime(clock) - cpu_start
+                profiler._active_threads.discard(tid)
+                profiler._local.in_batch = False
+                with profiler._lock:
+                    profiler.wall_time += wall
+                    profiler.cpu_time += cpu
+
+        BatchedCalls.__call__ = call
+        return super(GILContentionProfiler, self).__enter__()
+
+    def __exit__(self, *exc_info):
+        super(GILContentionProfiler, self).__exit__(*exc_info)
+        from joblib.parallel import BatchedCalls
+        BatchedCalls.__call__ = self._original_call
+
+
+def _accepts_params(method, params):
+    # benchmark methods can restrict the parameter space of their class
+    method_params = getattr(method, 'params', None)
+    if method_params is None:
+        return True
+    return all(p in values for p, values in zip(params, method_params))
+
+
+def _make_memory_tracker(kind):
+    def track(self, *params):
+        if getattr(self, '_peak_memory', None) is None:
+            time_methods = [getattr(self, name) for name in sorted(dir(self))
+                            if name.startswith('time_')]
+            with MemorySampler() as sampler:
+                for method in time_methods:
+                    if _accepts_params(method, params):
+                        method(*params)
+            self._peak_memory = sampler
+        peak = getattr(self._peak_memory, 'peak_{}'.format(kind))
+        # pss accounts pages shared between the workers only once, fall back
+        # to rss where it is not available
+        return peak[self.memory_metric] or peak['rss']
+    track.__name__ = 'track_peak_{}_memory'.format(kind)
+    track.unit = 'bytes'
+    return track
+
+
+def with_memory_tracking(klass):
+    """class decorator adding peak memory metrics to a SklearnBenchmark
+
+    The decorated class gets a track_peak_total_memory and a
+    track_peak_per_worker_memory method. Both run all the time_* methods of
+    the class for the current parameters under a MemorySampler and report the
+    peak memory (in the class memory_metric) of the parent and all its
+    workers, respectively of the largest worker.
+    """
+    klass.track_peak_total_memory = _make_memory_tracker('total')
+    klass.track_peak_per_worker_memory = _make_memory_tracker('per_worker')
+    return klass
+
+
+def _make_gil_profiler(time_method):
+    def track(self, *params):
+        backend = params[self.param_names.index('backend')]
+        if backend != 'threading':
+            # worker processes hold their own GIL
+            return float('nan')
+        with GILContentionProfiler() as profiler:
+            getattr(self, time_method.__name__)(*params)
+        return profiler.gil_bound_fraction
+    track.__name__ = time_method.__name__.replace(
+        'time_', 'track_gil_bound_fraction_', 1)
+    track.unit = 'fraction'
+    for attr in ['params', 'param_names']:
+        if hasattr(time_method, attr):
+            setattr(track, attr, getattr(time_method, attr))
+    return track
+
+
+def with_gil_profiling(klass):
+    """class decorator adding GIL contention metrics to a SklearnBenchmark
+
+    For each time_<workload> method of the class, the decorated class gets a
+    track_gil_bound_fraction_<workload> method, running it under a
+    GILContentionProfiler and reporting the fraction of the time its tasks
+    hold or wait for the GIL. The class must have a backend parameter, and the
+    metric is NaN for backends other than threading.
+    """
+    for name in sorted(dir(klass)):
+        if name.startswith('time_'):
+            track = _make_gil_profiler(getattr(klass, name))
+            setattr(klass, track.__name__, track)
+    return klass
+
 
 class EstimatorWithLargeList:
     """simple estimator, with a large list as an attribute
@@ -86,7 +1543,7 @@ class EstimatorWithLargeList:
         pass
 
     def predict(self, X):
-        return [0]*repeat(len(X))
+        return [0] * len(X)
 
     def score(self, *args, **kwargs):
         return 0
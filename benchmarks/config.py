@@ -3,6 +3,51 @@
 # default parameter values used for scikit-learn benchmarking
 #
 # Author: Pierre Glaser
+import json
+import os
+import warnings
+
+# number of timing samples recorded by asv for each benchmark, and duration
+# in seconds of the warm-up runs discarded before them
+REPEAT = int(os.environ.get('SKLEARN_BENCHMARKS_REPEAT', 1))
+WARMUP_TIME = float(os.environ.get('SKLEARN_BENCHMARKS_WARMUP_TIME', 0))
+
+# if set, every benchmark records a timeline of the joblib tasks it runs, and
+# writes it to this directory in the Chrome trace format (see TaskTracer)
+TRACE_DIR = os.environ.get('SKLEARN_BENCHMARKS_TRACE_DIR', '')
+
+# directory where CalibrationBench records the hardware and software
+# fingerprint of each run, read by sum_up_results.py
+FINGERPRINT_DIR = os.environ.get(
+    'SKLEARN_BENCHMARKS_FINGERPRINT_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'fingerprints'))
+
+# size multipliers of the real-world datasets (20newsgroups, California
+# housing). Scales other than 1 use synthetic stand-ins, for instance
+# SKLEARN_BENCHMARKS_SCALES=1,10,100
+DATASET_SCALES = [
+    int(s)
+    for s in os.environ.get('SKLEARN_BENCHMARKS_SCALES', '1').split(',')]
+
+
+# sizes of the on-disk datasets streamed by the out-of-core benchmarks, as
+# fractions of the physical memory of the machine
+OUT_OF_CORE_SIZES = [
+    float(s) for s in os.environ.get('SKLEARN_BENCHMARKS_OUT_OF_CORE_SIZES',
+                                     '0.25,1.5').split(',')]
+
+
+def _scaling_n_jobs(max_n_jobs):
+    # powers of two up to the number of cpus, and the number of cpus itself
+    n_jobs = [2 ** i for i in range(max_n_jobs.bit_length())]
+    if n_jobs[-1] != max_n_jobs:
+        n_jobs.append(max_n_jobs)
+    return n_jobs
+
+
+# n_jobs values swept by the strong/weak scaling benchmarks
+SCALING_N_JOBS = _scaling_n_jobs(os.cpu_count() or 1)
 
 N_SAMPLES = {
     'AdaBoostRegressor': 30000,
@@ -51,3 +96,157 @@ N_SAMPLES = {
     'TransformedTargetRegressor': 10000
  }
 
+
+N_SAMPLES_CLASSIFIERS = {
+    'AdaBoostClassifier': 30000,
+    'BaggingClassifier': 30000,
+    'BernoulliNB': 100000,
+    'CalibratedClassifierCV': 30000,
+    'ComplementNB': 100000,
+    'DecisionTreeClassifier': 100000,
+    'ExtraTreeClassifier': 100000,
+    'ExtraTreesClassifier': 70000,
+    'GaussianNB': 100000,
+    'GaussianProcessClassifier': 2000,
+    'GradientBoostingClassifier': 20000,
+    'KNeighborsClassifier': 100000,
+    'LabelPropagation': 5000,
+    'LabelSpreading': 5000,
+    'LinearDiscriminantAnalysis': 100000,
+    'LinearSVC': 50000,
+    'LogisticRegression': 100000,
+    'LogisticRegressionCV': 30000,
+    'MLPClassifier': 7000,
+    'MultinomialNB': 100000,
+    'NearestCentroid': 100000,
+    'NuSVC': 10000,
+    'PassiveAggressiveClassifier': 100000,
+    'Perceptron': 100000,
+    'QuadraticDiscriminantAnalysis': 100000,
+    'RadiusNeighborsClassifier': 10000,
+    'RandomForestClassifier': 30000,
+    'RidgeClassifier': 100000,
+    'RidgeClassifierCV': 70000,
+    'SGDClassifier': 100000,
+    'SVC': 10000
+ }
+
+N_SAMPLES_TRANSFORMERS = {
+    'AdditiveChi2Sampler': 100000,
+    'BernoulliRBM': 20000,
+    'Binarizer': 100000,
+    'Birch': 20000,
+    'DictionaryLearning': 2000,
+    'FactorAnalysis': 50000,
+    'FastICA': 50000,
+    'FeatureAgglomeration': 20000,
+    'FunctionTransformer': 100000,
+    'GenericUnivariateSelect': 100000,
+    'IncrementalPCA': 100000,
+    'Isomap': 3000,
+    'KBinsDiscretizer': 100000,
+    'KMeans': 100000,
+    'KernelPCA': 3000,
+    'LatentDirichletAllocation': 10000,
+    'LinearDiscriminantAnalysis': 100000,
+    'LocallyLinearEmbedding': 3000,
+    'MaxAbsScaler': 100000,
+    'MinMaxScaler': 100000,
+    'MiniBatchDictionaryLearning': 10000,
+    'MiniBatchKMeans': 100000,
+    'MiniBatchSparsePCA': 5000,
+    'MissingIndicator': 100000,
+    'NMF': 30000,
+    'Normalizer': 100000,
+    'Nystroem': 30000,
+    'OrdinalEncoder': 100000,
+    'PCA': 100000,
+    'PolynomialFeatures': 100000,
+    'PowerTransformer': 50000,
+    'QuantileTransformer': 100000,
+    'RBFSampler': 100000,
+    'RobustScaler': 100000,
+    'SelectFdr': 100000,
+    'SelectFpr': 100000,
+    'SelectFwe': 100000,
+    'SelectKBest': 100000,
+    'SelectPercentile': 100000,
+    'SimpleImputer': 100000,
+    'SkewedChi2Sampler': 100000,
+    'SparsePCA': 5000,
+    'StandardScaler': 100000,
+    'TfidfTransformer': 100000,
+    'TruncatedSVD': 100000,
+    'VarianceThreshold': 100000
+ }
+
+# number of samples of estimators missing from the tables above
+DEFAULT_N_SAMPLES = 10000
+
+# estimators that require non-negative input data
+NON_NEGATIVE_ESTIMATORS = {
+    'AdditiveChi2Sampler', 'ComplementNB', 'LatentDirichletAllocation',
+    'MultinomialNB', 'NMF', 'SkewedChi2Sampler', 'TfidfTransformer'}
+
+# estimators that cannot be fitted on the generated numerical (X, y) data:
+# 2-D data with 10 features, some of them negative (IsotonicRegression needs
+# 1-D X, the random projections more features, OneHotEncoder non-negative
+# integers...). Private estimators and the ones needing constructor arguments
+# are filtered out by benchmarks.common
+UNSUPPORTED_ESTIMATORS = {
+    'ColumnTransformer', 'CountVectorizer', 'DictVectorizer', 'FeatureHasher',
+    'FeatureUnion', 'GaussianRandomProjection', 'HashingVectorizer',
+    'IsotonicRegression', 'KernelCenterer', 'LabelBinarizer', 'LabelEncoder',
+    'MultiLabelBinarizer', 'OneHotEncoder', 'RFE', 'RFECV', 'SelectFromModel',
+    'SparseCoder', 'SparseRandomProjection', 'TfidfVectorizer'}
+
+# the per-estimator benchmarks only run a rotating subset of the estimators
+# each night, so that all of them run within NIGHTLY_TIME_BUDGET seconds over
+# the whole rotation. SKLEARN_BENCHMARKS_ROTATION can be set to 'all' to run
+# every estimator, or to the index of the rotation slot to run, for instance
+# the number of days since the epoch to run one slot each day. It must be set
+# once for the whole run, and is never derived from the clock or from the
+# benchmarked commit, which change within a run. By default, slot 0 runs
+NIGHTLY_TIME_BUDGET = float(
+    os.environ.get('SKLEARN_BENCHMARKS_BUDGET', 4 * 3600))
+ROTATION = os.environ.get('SKLEARN_BENCHMARKS_ROTATION', '')
+
+# expected duration of a single fit of an estimator at its N_SAMPLES size
+EXPECTED_FIT_TIME = 1.
+
+# table generated by calibrate.py, overriding the sizes above with the ones
+# that make a single-core fit last its target_time. It also holds the fitted
+# cost model fit_time = a * n_samples ** b of each estimator (None if it
+# could not be fitted). The table is ignored if it was generated with another
+# format or scikit-learn version
+CALIBRATION_FILE = os.path.join(os.path.dirname(__file__), 'n_samples.json')
+CALIBRATION_FORMAT_VERSION = 1
+
+
+def _load_calibration(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        calibration = json.load(f)
+
+    import sklearn
+    stale = [(key, calibration.get(key), expected) for key, expected in [
+        ('format_version', CALIBRATION_FORMAT_VERSION),
+        ('sklearn_version', sklearn.__version__)]
+        if calibration.get(key) != expected]
+    if stale:
+        warnings.warn('ignoring {}: {}, run calibrate.py again'.format(
+            path, ', '.join('{} is {!r}, expected {!r}'.format(*s)
+                            for s in stale)))
+        return None
+    tables = {'regressor': N_SAMPLES, 'classifier': N_SAMPLES_CLASSIFIERS,
+              'transformer': N_SAMPLES_TRANSFORMERS}
+    for family, estimators in calibration['estimators'].items():
+        tables[family].update({name: result['n_samples']
+                               for name, result in estimators.items()})
+    return calibration
+
+
+CALIBRATION = _load_calibration(CALIBRATION_FILE)
+if CALIBRATION is not None:
+    EXPECTED_FIT_TIME = CALIBRATION['target_time']
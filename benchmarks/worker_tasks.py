@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Tasks run by the worker latency benchmarks. Workers import this module to
+# unpickle the tasks, so it must not import scikit-learn, directly or through
+# benchmarks.common: the import cost measured by import_sklearn would
+# otherwise be paid before the task starts.
+#
+# Author: Pierre Glaser
+import importlib
+import sys
+import time
+import timeit
+
+# the modules a typical fit task needs
+SKLEARN_MODULES = ['sklearn.base', 'sklearn.ensemble', 'sklearn.linear_model',
+                   'sklearn.model_selection']
+
+
+def noop():
+    pass
+
+
+def import_sklearn():
+    """import SKLEARN_MODULES in the worker running the task
+
+    Return the wall clock time at which the task started, the time spent
+    importing, and the number of modules that were not loaded in the worker
+    yet (0 if it inherited them from its parent, or if a previous task
+    imported them).
+    """
+    started = time.time()
+    n_modules = len(sys.modules)
+    t0 = timeit.default_timer()
+    for name in SKLEARN_MODULES:
+        importlib.import_module(name)
+    return started, timeit.default_timer() - t0, len(sys.modules) - n_modules
@@ -0,0 +1,166 @@
+"""Calibrate the number of samples used by the per-estimator benchmarks
+
+For each estimator, search for the number of samples for which a single-core
+fit takes a target time, by fitting a power-law cost model
+fit_time = a * n_samples ** b on timings of increasing dataset sizes. The
+resulting table, along with the fitted coefficients, is written to
+benchmarks/n_samples.json, which benchmarks/config.py loads.
+
+Usage: python calibrate.py [--target-time 1] [--family regressor ...]
+"""
+import argparse
+import datetime
+import json
+import os
+import timeit
+
+# calibrate single-core fit times: this must be set before numpy is imported
+for var in ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']:
+    os.environ[var] = '1'
+
+import numpy as np  # noqa
+
+from benchmarks.common import ALL_CLASSIFIERS, ALL_REGRESSORS  # noqa
+from benchmarks.common import ALL_TRANSFORMERS  # noqa
+from benchmarks.config import CALIBRATION_FILE, NON_NEGATIVE_ESTIMATORS  # noqa
+from benchmarks.config import CALIBRATION_FORMAT_VERSION  # noqa
+from benchmarks.config import UNSUPPORTED_ESTIMATORS  # noqa
+
+FAMILIES = {
+    'regressor': (ALL_REGRESSORS, 'make_regression'),
+    'classifier': (ALL_CLASSIFIERS, 'make_classification'),
+    'transformer': (ALL_TRANSFORMERS, 'make_classification'),
+}
+
+
+def time_fit(cls, estimator_name, generator, n_samples, n_features=10):
+    """time a single-core fit of cls on a generated dataset"""
+    kwargs = dict(n_samples=n_samples, n_features=n_features, random_state=0)
+    if 'MultiTask' in estimator_name:
+        kwargs['n_targets'] = 4
+    X, y = generator(**kwargs)
+    if estimator_name in NON_NEGATIVE_ESTIMATORS:
+        X = np.abs(X)
+
+    estimator = cls()
+    if 'n_jobs' in estimator.get_params():
+        estimator.set_params(n_jobs=1)
+    t0 = timeit.default_timer()
+    estimator.fit(X, y)
+    return timeit.default_timer() - t0
+
+
+def fit_power_law(n_samples, fit_times):
+    """least-squares fit of log(fit_time) = log(a) + b * log(n_samples)"""
+    b, log_a = np.polyfit(np.log(n_samples), np.log(fit_times), 1)
+    return float(np.exp(log_a)), float(b)
+
+
+def calibrate(cls, estimator_name, generator, target_time=1.,
+              min_samples=500, max_samples=1000000, min_time=0.01,
+              n_iter=4, tol=0.2):
+    """search the number of samples for which a fit takes target_time
+
+    The dataset size is first doubled until the fit time exceeds a quarter of
+    target_time. A power law is then fitted on the timings longer than
+    min_time (shorter ones are too noisy) and used to predict the number of
+    samples reaching target_time, which is measured in turn and added to the
+    timings, up to n_iter times or until within a relative tolerance tol.
+    If less than two sizes can be measured, no cost model is fitted and a
+    and b are None.
+    """
+    n_samples, fit_times = [], []
+
+    n = min_samples
+    while True:
+        n_samples.append(n)
+        fit_times.append(time_fit(cls, estimator_name, generator, n))
+        if fit_times[-1] > target_time / 4 or n >= max_samples:
+            break
+        n = min(2 * n, max_samples)
+
+    if len(n_samples) == 1 and min_samples // 4 >= 1:
+        # already too slow at min_samples: the cost model needs a second,
+        # smaller, size
+        n_samples.insert(0, min_samples // 4)
+        fit_times.insert(0, time_fit(cls, estimator_name, generator,
+                                     n_samples[0]))
+
+    a = b = None
+    for _ in range(n_iter if len(n_samples) >= 2 else 0):
+        mask = np.array(fit_times) > min_time
+        if mask.sum() < 2:
+            # too fast to be modeled, even at max_samples
+            mask[:] = True
+        a, b = fit_power_law(np.array(n_samples)[mask],
+                             np.array(fit_times)[mask])
+        if abs(fit_times[-1] - target_time) < tol * target_time or b <= 0:
+            break
+        n = int(np.clip((target_time / a) ** (1 / b), min_samples,
+                        max_samples))
+        if n == n_samples[-1]:
+            break
+        n_samples.append(n)
+        fit_times.append(time_fit(cls, estimator_name, generator, n))
+
+    # keep the measured size closest to the target
+    best = int(np.argmin(np.abs(np.log(fit_times) - np.log(target_time))))
+    return dict(n_samples=n_samples[best], fit_time=fit_times[best], a=a,
+                b=b)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--target-time', type=float, default=1.,
+                        help='target single-core fit time, in seconds')
+    parser.add_argument('--family', nargs='+', choices=sorted(FAMILIES),
+                        default=sorted(FAMILIES))
+    parser.add_argument('--estimators', nargs='+', default=None,
+                        help='only calibrate these estimators')
+    parser.add_argument('--max-samples', type=int, default=1000000)
+    parser.add_argument('--output', default=CALIBRATION_FILE)
+    args = parser.parse_args()
+
+    import sklearn
+    import sklearn.datasets
+
+    # update an existing table, so that estimators can be recalibrated
+    # separately
+    table = {'estimators': {}}
+    if os.path.exists(args.output):
+        with open(args.output) as f:
+            table = json.load(f)
+    if (table.get('target_time', args.target_time) != args.target_time or
+            table.get('format_version') != CALIBRATION_FORMAT_VERSION or
+            table.get('sklearn_version') != sklearn.__version__):
+        table['estimators'] = {}
+
+    for family in args.family:
+        estimators, generator_name = FAMILIES[family]
+        generator = getattr(sklearn.datasets, generator_name)
+        results = table['estimators'].setdefault(family, {})
+        for name in sorted(estimators):
+            if name in UNSUPPORTED_ESTIMATORS or (
+                    args.estimators is not None and
+                    name not in args.estimators):
+                continue
+            try:
+                results[name] = calibrate(estimators[name], name, generator,
+                                          target_time=args.target_time,
+                                          max_samples=args.max_samples)
+            except Exception as e:
+                print('{}: calibration failed ({!r})'.format(name, e))
+                continue
+            print('{}: n_samples={n_samples}, fit_time={fit_time:.3f}s, '
+                  'a={a}, b={b}'.format(name, **results[name]))
+
+    table.update(format_version=CALIBRATION_FORMAT_VERSION,
+                 sklearn_version=sklearn.__version__,
+                 target_time=args.target_time,
+                 date=datetime.datetime.now().isoformat())
+    with open(args.output, 'w') as f:
+        json.dump(table, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,620 @@
+"""Run independent benchmark cases concurrently on disjoint sets of CPUs
+
+asv runs the parameter combinations of the suite one after the other
+(processes = 1), although most of them only use 1 to 4 cores. This script
+runs each combination of each benchmark (a case) in its own Python process,
+pinned with sched_setaffinity to a set of CPUs that no other running case
+uses, and packs as many cases as the machine holds. Worker processes started
+by a case inherit its affinity, and loky sizes its pools from it.
+
+The number of CPUs of a case is derived from its parameters: n_jobs,
+n_workers * threads_per_worker, or outer_n_jobs * inner_n_jobs *
+blas_threads. Cases needing at least as many CPUs as available, and the
+classes with a true exclusive attribute, run alone once the packed ones are
+done. By default, only one logical CPU per physical
+core is used, and the CPUs of a case are taken from a single NUMA node when
+possible. Cases still share caches and memory bandwidth: --check-serial N
+runs N random time_* cases again one at a time, on as many CPUs, and reports
+the ones whose timings differ by more than --tolerance.
+
+Results are written in the asv format, in the results directory of
+asv.conf.json, so that sum_up_results.py and plot.py read them as any other
+asv result. The benchmarks run in the current environment, as with
+asv run --python=same.
+
+Usage: python orchestrate.py [--bench REGEX] [--check-serial 20]
+"""
+import argparse
+import importlib
+import inspect
+import itertools
+import json
+import os
+import pickle
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_DIR = os.path.join(ROOT_DIR, 'benchmarks')
+BENCHMARK_PREFIXES = ('time_', 'track_')
+
+RESULT_COLUMNS = ['result', 'params', 'version', 'started_at', 'duration',
+                  'stats_ci_99_a', 'stats_ci_99_b', 'stats_q_25',
+                  'stats_q_75', 'stats_number', 'stats_repeat', 'samples',
+                  'profile']
+
+
+def _read_cpulist(path):
+    # parse the "0-3,8,10-11" format of sysfs
+    with open(path) as f:
+        content = f.read().strip()
+    cpus = set()
+    for part in filter(None, content.split(',')):
+        start, _, stop = part.partition('-')
+        cpus.update(range(int(start), int(stop or start) + 1))
+    return cpus
+
+
+def cpu_topology(use_smt=False, reserve=0):
+    """list the usable CPUs, grouped by NUMA node
+
+    Unless use_smt is True, only the first logical CPU of each physical core
+    is kept. The last reserve CPUs are left to the orchestrator and the OS.
+    """
+    cpus = set(os.sched_getaffinity(0))
+    if not use_smt:
+        for cpu in sorted(cpus):
+            path = ('/sys/devices/system/cpu/cpu{}/topology/'
+                    'thread_siblings_list'.format(cpu))
+            if cpu in cpus and os.path.exists(path):
+                cpus -= _read_cpulist(path) - {cpu}
+    cpus = sorted(cpus)
+    if reserve:
+        cpus = cpus[:max(1, len(cpus) - reserve)]
+
+    nodes = []
+    node_dir = '/sys/devices/system/node'
+    if os.path.isdir(node_dir):
+        for name in sorted(os.listdir(node_dir)):
+            if re.match(r'node\d+$', name):
+                node_cpus = _read_cpulist(
+                    os.path.join(node_dir, name, 'cpulist'))
+                nodes.append([cpu for cpu in cpus if cpu in node_cpus])
+    nodes = [node for node in nodes if node]
+    if sum(map(len, nodes)) != len(cpus):
+        nodes = [cpus]
+    return nodes
+
+
+def allocate_cpus(free, n_cpus):
+    """take n_cpus CPUs out of free, a list of per-node lists of free CPUs
+
+    The node with the fewest free CPUs that can hold the case is preferred,
+    to keep room for larger cases. Returns None if not enough CPUs are free.
+    """
+    if sum(map(len, free)) < n_cpus:
+        return None
+    candidates = [node for node in free if len(node) >= n_cpus]
+    if candidates:
+        node = min(candidates, key=len)
+        cpus = node[:n_cpus]
+        del node[:n_cpus]
+        return cpus
+    cpus = []
+    for node in sorted(free, key=len, reverse=True):
+        taken = node[:n_cpus - len(cpus)]
+        del node[:len(taken)]
+        cpus.extend(taken)
+        if len(cpus) == n_cpus:
+            break
+    return cpus
+
+
+def release_cpus(free, nodes, cpus):
+    for node, free_node in zip(nodes, free):
+        free_node.extend(cpu for cpu in cpus if cpu in node)
+        free_node.sort()
+
+
+def case_cpus(params, n_available):
+    """number of CPUs used by a benchmark case, from its parameters"""
+    def _n(key, default=1):
+        value = int(params.get(key, default))
+        return n_available if value < 0 else value
+
+    if 'outer_n_jobs' in params:
+        n_cpus = (_n('outer_n_jobs') * _n('inner_n_jobs') *
+                  _n('blas_threads'))
+    elif 'n_workers' in params:
+        n_cpus = _n('n_workers') * _n('threads_per_worker')
+    else:
+        n_cpus = _n('n_jobs')
+    return max(1, n_cpus)
+
+
+def _benchmark_params(cls, method):
+    # parameters declared on the method take precedence over the class ones
+    params = getattr(method, 'params', getattr(cls, 'params', []))
+    param_names = getattr(method, 'param_names',
+                          getattr(cls, 'param_names', []))
+    params = list(params)
+    if params and not isinstance(params[0], (list, tuple)):
+        params = [params]
+    param_names = list(param_names) or [
+        'param{}'.format(i + 1) for i in range(len(params))]
+    return param_names, params
+
+
+def asv_benchmark_versions():
+    """the versions asv gives to the benchmarks, by name
+
+    asv hashes the source of each benchmark with its own scheme. Results
+    carrying another version would be seen as coming from changed
+    benchmarks, so the versions are computed by asv's own discovery.
+    """
+    try:
+        from asv_runner.discovery import disc_benchmarks
+    except ImportError:
+        # asv < 0.6
+        from asv.benchmark import disc_benchmarks
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    return {benchmark.name: benchmark.version
+            for benchmark in disc_benchmarks(BENCHMARK_DIR)}
+
+
+def discover_benchmarks(bench_regex=None):
+    """find the time_* and track_* methods of the benchmark classes
+
+    As asv does, the public classes of each benchmarks/*.py module are
+    collected. Returns a dict mapping the asv names of the benchmarks to their
+    metadata, in the format of asv's benchmarks.json.
+    """
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    versions = asv_benchmark_versions()
+    benchmarks = {}
+    for filename in sorted(os.listdir(BENCHMARK_DIR)):
+        module_name, ext = os.path.splitext(filename)
+        if ext != '.py' or module_name.startswith('_'):
+            continue
+        module = importlib.import_module('benchmarks.' + module_name)
+        for class_name, cls in sorted(vars(module).items()):
+            if class_name.startswith('_') or not inspect.isclass(cls):
+                continue
+            for method_name in dir(cls):
+                if not method_name.startswith(BENCHMARK_PREFIXES):
+                    continue
+                name = '.'.join([module_name, class_name, method_name])
+                if bench_regex is not None and not re.search(bench_regex,
+                                                             name):
+                    continue
+                if name not in versions:
+                    # not a benchmark for asv either
+                    continue
+                method = getattr(cls, method_name)
+                param_names, params = _benchmark_params(cls, method)
+                kind = method_name.split('_', 1)[0]
+                benchmarks[name] = {
+                    'name': name,
+                    'type': kind,
+                    'code': inspect.getsource(method),
+                    'param_names': param_names,
+                    'params': [[repr(p) for p in values]
+                               for values in params],
+                    'unit': ('seconds' if kind == 'time' else
+                             getattr(method, 'unit', 'unit')),
+                    'timeout': getattr(cls, 'timeout', 60),
+                    'version': versions[name],
+                    # non-asv keys used to run the cases
+                    '_module': module_name,
+                    '_class': class_name,
+                    '_method': method_name,
+                    '_combinations': list(itertools.product(*params)),
+                    '_exclusive': getattr(cls, 'exclusive', False),
+                }
+    return benchmarks
+
+
+def run_case(spec):
+    """run one combination of the parameters of a benchmark, in this process
+
+    Called in the child processes started by the orchestrator, once pinned to
+    their CPUs. Returns the result and the timing samples, or None if the
+    combination is skipped (NotImplementedError in setup).
+    """
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    module = importlib.import_module('benchmarks.' + spec['module'])
+    cls = getattr(module, spec['class'])
+    # the parameter values come from the discovery in the orchestrator: the
+    # params of a class can be computed at import time (estimators scheduled
+    # by the rotation...), and the index alone could resolve to other values.
+    # As in asv, the value returned by setup_cache, if any, comes first
+    combination = tuple(spec['setup_cache']) + tuple(spec['combination'])
+
+    bench = cls()
+    method = getattr(bench, spec['method'])
+    try:
+        if hasattr(bench, 'setup'):
+            bench.setup(*combination)
+    except NotImplementedError:
+        return None, None
+    try:
+        if spec['method'].startswith('track_'):
+            return float(method(*combination)), None
+
+        timer = getattr(bench, 'timer', timeit.default_timer)
+        number = max(1, getattr(bench, 'number', 1))
+        repeat = getattr(bench, 'repeat', 1)
+        if isinstance(repeat, (list, tuple)):
+            repeat = repeat[0]
+        warmup_time = getattr(bench, 'warmup_time', 0)
+        if warmup_time > 0:
+            start = timer()
+            while timer() - start < warmup_time:
+                method(*combination)
+        samples = []
+        for _ in range(max(1, repeat)):
+            start = timer()
+            for _ in range(number):
+                method(*combination)
+            samples.append((timer() - start) / number)
+        return sorted(samples)[len(samples) // 2], samples
+    finally:
+        if hasattr(bench, 'teardown'):
+            bench.teardown(*combination)
+
+
+def run_setup_caches(benchmarks):
+    """run the setup_cache method of the benchmark classes that have one
+
+    As asv does, setup_cache runs once per class, here in the orchestrator
+    before the cases. Returns a dict mapping (module, class) to a tuple
+    holding its return value, passed to the cases of the class before their
+    parameters.
+    """
+    caches = {}
+    for benchmark in benchmarks.values():
+        key = benchmark['_module'], benchmark['_class']
+        if key in caches:
+            continue
+        module = importlib.import_module('benchmarks.' + key[0])
+        cls = getattr(module, key[1])
+        caches[key] = ((cls().setup_cache(),) if hasattr(cls, 'setup_cache')
+                       else ())
+    return caches
+
+
+def _child_main(spec_path, output_path):
+    with open(spec_path, 'rb') as f:
+        spec = pickle.load(f)
+    os.sched_setaffinity(0, spec['cpus'])
+    result, samples = run_case(spec)
+    with open(output_path, 'w') as f:
+        json.dump({'result': result, 'samples': samples}, f)
+
+
+class _RunningCase:
+    def __init__(self, case, cpus, env, tmp_dir):
+        self.case = case
+        self.cpus = cpus
+        prefix = os.path.join(tmp_dir, '{}-{}'.format(case['name'],
+                                                      case['index']))
+        self.output_path = prefix + '.result.json'
+        spec_path = prefix + '.spec.pkl'
+        with open(spec_path, 'wb') as f:
+            pickle.dump({'module': case['_module'], 'class': case['_class'],
+                         'method': case['_method'],
+                         'combination': case['_combination'],
+                         'setup_cache': case.get('_setup_cache', ()),
+                         'cpus': cpus}, f)
+        self.log = open(prefix + '.log', 'w+')
+        self.started_at = time.time()
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--run-case',
+             spec_path, self.output_path],
+            stdout=self.log, stderr=subprocess.STDOUT, env=env, cwd=ROOT_DIR)
+
+    def poll(self):
+        if self.process.poll() is None:
+            if time.time() - self.started_at > self.case['deadline']:
+                self.process.kill()
+                self.process.wait()
+                return dict(result=None, samples=None, timed_out=True)
+            return None
+        result = dict(result=None, samples=None)
+        if self.process.returncode == 0:
+            with open(self.output_path) as f:
+                result = json.load(f)
+        else:
+            self.log.seek(0)
+            result['log'] = self.log.read()[-2000:]
+        self.log.close()
+        return result
+
+
+def run_cases(cases, nodes, env, exclusive_cpus, verbose=True):
+    """run the cases concurrently on disjoint CPU sets
+
+    cases needing at least as many CPUs as there are in nodes run one at a
+    time on exclusive_cpus, after the others. Returns a dict mapping
+    (name, index) to the result of each case and its duration.
+    """
+    n_available = sum(map(len, nodes))
+    packed = [c for c in cases if c['n_cpus'] < n_available]
+    exclusive = [c for c in cases if c['n_cpus'] >= n_available]
+    # largest cases first, the small ones then fill the gaps
+    pending = sorted(packed, key=lambda c: -c['n_cpus'])
+    free = [list(node) for node in nodes]
+    running = []
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        while pending or running or exclusive:
+            if not pending and not running:
+                # the machine is idle: run the next exclusive case
+                case = exclusive.pop(0)
+                running.append(_RunningCase(case, exclusive_cpus, env,
+                                            tmp_dir))
+            for case in list(pending):
+                cpus = allocate_cpus(free, case['n_cpus'])
+                if cpus is None:
+                    continue
+                pending.remove(case)
+                running.append(_RunningCase(case, cpus, env, tmp_dir))
+
+            time.sleep(0.05)
+            for run in list(running):
+                result = run.poll()
+                if result is None:
+                    continue
+                running.remove(run)
+                if run.cpus is not exclusive_cpus:
+                    release_cpus(free, nodes, run.cpus)
+                result['started_at'] = run.started_at
+                result['duration'] = time.time() - run.started_at
+                case = run.case
+                results[case['name'], case['index']] = result
+                if verbose:
+                    status = ('timed out' if result.get('timed_out') else
+                              'failed' if 'log' in result else
+                              'skipped' if result['result'] is None else
+                              '{:.4g}'.format(result['result']))
+                    print('[{}/{}] {}({}) on {} cpus: {}'.format(
+                        len(results), len(cases), case['name'],
+                        ', '.join(case['params']), len(run.cpus), status))
+                    if 'log' in result:
+                        print(result['log'])
+    return results
+
+
+def check_serial(cases, results, nodes, env, n_cases, tolerance,
+                 random_state=0):
+    """run time_* cases again, one at a time, and compare their timings
+
+    Each case runs on as many CPUs as in the concurrent run, while the rest
+    of the machine is idle. Returns the (case, concurrent, serial) tuples
+    whose relative difference exceeds tolerance.
+    """
+    candidates = [c for c in cases if c['type'] == 'time' and
+                  results[c['name'], c['index']]['result'] is not None]
+    rng = random.Random(random_state)
+    sample = rng.sample(candidates, min(n_cases, len(candidates)))
+    n_available = sum(map(len, nodes))
+
+    mismatches = []
+    for case in sample:
+        # a single case whose CPUs are taken from an otherwise idle machine
+        cpus = allocate_cpus([list(node) for node in nodes],
+                             min(case['n_cpus'], n_available))
+        serial = run_cases([dict(case, n_cpus=len(cpus))], [cpus], env, cpus,
+                           verbose=False)
+        concurrent = results[case['name'], case['index']]['result']
+        serial = serial[case['name'], case['index']]['result']
+        if serial is None:
+            continue
+        difference = abs(concurrent - serial) / serial
+        print('{}({}): concurrent {:.4g}s, serial {:.4g}s ({:+.1%})'.format(
+            case['name'], ', '.join(case['params']), concurrent, serial,
+            concurrent / serial - 1))
+        if difference > tolerance:
+            mismatches.append((case, concurrent, serial))
+    return mismatches
+
+
+def _git_commit_hash(path):
+    try:
+        return subprocess.check_output(
+            ['git', '-C', path, 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _git_commit_date(path, commit_hash):
+    # date of a commit in seconds since the epoch, as asv reads it
+    try:
+        return int(subprocess.check_output(
+            ['git', '-C', path, 'rev-list', '-n', '1', '--format=%at',
+             commit_hash], stderr=subprocess.DEVNULL).decode().split()[-1])
+    except (OSError, subprocess.CalledProcessError, IndexError, ValueError):
+        return None
+
+
+def write_results(results_dir, machine, commit_hash, commit_date, env_name,
+                  benchmarks, cases, results):
+    """write the results in asv's format, merged with existing ones
+
+    commit_date is the date of the benchmarked commit in seconds since the
+    epoch: asv orders the results by it, not by the date of the run. The
+    benchmarks.json of the results directory is updated with the metadata of
+    the benchmarks that were run.
+    """
+    machine_dir = os.path.join(results_dir, machine)
+    os.makedirs(machine_dir, exist_ok=True)
+
+    machine_path = os.path.join(machine_dir, 'machine.json')
+    machine_info = dict(machine=machine, os=' '.join(platform.uname()[:3]),
+                        arch=platform.machine(), cpu=platform.processor(),
+                        num_cpu=str(os.cpu_count()), ram='', version=1)
+    if not os.path.exists(machine_path):
+        with open(machine_path, 'w') as f:
+            json.dump(machine_info, f, indent=4, sort_keys=True)
+
+    path = os.path.join(machine_dir, '{}-{}.json'.format(commit_hash[:8],
+                                                         env_name))
+    python = '{}.{}'.format(*sys.version_info[:2])
+    content = dict(commit_hash=commit_hash, env_name=env_name,
+                   date=int(commit_date * 1000), python=python,
+                   params=dict({k: v for k, v in machine_info.items()
+                                if k != 'version'}, python=python),
+                   requirements={}, env_vars={}, result_columns=RESULT_COLUMNS,
+                   results={}, durations={}, version=2)
+    if os.path.exists(path):
+        with open(path) as f:
+            existing = json.load(f)
+        if existing.get('result_columns') == RESULT_COLUMNS:
+            content['results'] = existing['results']
+
+    for name, benchmark in benchmarks.items():
+        n = len(benchmark['_combinations'])
+        values = [None] * n
+        samples = [None] * n
+        started_at = [None] * n
+        durations = [None] * n
+        for case in cases:
+            if case['name'] != name:
+                continue
+            result = results.get((name, case['index']))
+            if result is None:
+                continue
+            values[case['index']] = result['result']
+            samples[case['index']] = result['samples']
+            started_at[case['index']] = int(result['started_at'] * 1000)
+            durations[case['index']] = result['duration']
+        content['results'][name] = [
+            values, benchmark['params'], benchmark['version'],
+            max(filter(None, started_at), default=None),
+            sum(filter(None, durations)), None, None, None, None, None, None,
+            samples, None]
+
+    with open(path + '.tmp', 'w') as f:
+        json.dump(content, f)
+    os.replace(path + '.tmp', path)
+
+    benchmarks_path = os.path.join(results_dir, 'benchmarks.json')
+    metadata = {'version': 2}
+    if os.path.exists(benchmarks_path):
+        with open(benchmarks_path) as f:
+            metadata = json.load(f)
+    for name, benchmark in benchmarks.items():
+        metadata[name] = {k: v for k, v in benchmark.items()
+                          if not k.startswith('_')}
+    with open(benchmarks_path + '.tmp', 'w') as f:
+        json.dump(metadata, f, indent=4, sort_keys=True)
+    os.replace(benchmarks_path + '.tmp', benchmarks_path)
+    return path
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--run-case':
+        return _child_main(*sys.argv[2:])
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--bench', '-b', default=None,
+                        help='regular expression selecting the benchmarks')
+    parser.add_argument('--machine', default=socket.gethostname())
+    parser.add_argument('--commit-hash', default=None,
+                        help='commit of the benchmarked joblib (by default, '
+                        'the one checked out in $ASV_ENV_DIR/project)')
+    parser.add_argument('--commit-date', type=int, default=None,
+                        help='date of the benchmarked commit, in seconds '
+                        'since the epoch (by default, read from the '
+                        'checkout)')
+    parser.add_argument('--env-name', default=None)
+    parser.add_argument('--use-smt', action='store_true',
+                        help='also run cases on hyperthread siblings')
+    parser.add_argument('--reserve', type=int, default=1,
+                        help='number of CPUs left to the orchestrator')
+    parser.add_argument('--check-serial', type=int, default=0, metavar='N',
+                        help='run N time_* cases again one at a time and '
+                        'compare their timings')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='relative difference allowed by --check-serial')
+    args = parser.parse_args()
+
+    # the benchmarks look for the joblib checkout of the asv environment
+    os.environ.setdefault('ASV_ENV_DIR', sys.prefix)
+    project_dir = os.path.join(os.environ['ASV_ENV_DIR'], 'project')
+    commit_hash = args.commit_hash or _git_commit_hash(project_dir)
+    if commit_hash is None:
+        parser.error('could not find the benchmarked commit, use '
+                     '--commit-hash')
+    commit_date = args.commit_date or _git_commit_date(project_dir,
+                                                       commit_hash)
+    if commit_date is None:
+        parser.error('could not find the date of the benchmarked commit, '
+                     'use --commit-date')
+    env_name = args.env_name or 'orchestrate-py{}.{}'.format(
+        *sys.version_info[:2])
+    # as set by asv, see benchmarks.common.write_fingerprint. They are set
+    # before the discovery, which must see the environment of the cases
+    os.environ['ASV_COMMIT'] = commit_hash
+    os.environ['ASV_ENV_NAME'] = env_name
+    os.environ['ASV_MACHINE'] = args.machine
+    env = dict(os.environ)
+
+    from asv.config import Config
+    results_dir = Config.load(os.path.join(ROOT_DIR,
+                                           'asv.conf.json')).results_dir
+
+    nodes = cpu_topology(use_smt=args.use_smt, reserve=args.reserve)
+    n_available = sum(map(len, nodes))
+    benchmarks = discover_benchmarks(args.bench)
+    setup_caches = run_setup_caches(benchmarks)
+    cases = []
+    for name, benchmark in sorted(benchmarks.items()):
+        for index, (combination, values) in enumerate(zip(
+                itertools.product(*benchmark['params']),
+                benchmark['_combinations'])):
+            params = dict(zip(benchmark['param_names'],
+                              [p.strip("'") for p in combination]))
+            cases.append(dict(
+                benchmark, index=index, params=list(combination),
+                _combination=values,
+                _setup_cache=setup_caches[benchmark['_module'],
+                                          benchmark['_class']],
+                n_cpus=(n_available if benchmark['_exclusive'] else
+                        case_cpus(params, n_available)),
+                # leave time to import the suite and to run setup
+                deadline=benchmark['timeout'] * 2 + 60))
+    print('{} cases of {} benchmarks on {} cpus ({} numa nodes)'.format(
+        len(cases), len(benchmarks), n_available, len(nodes)))
+
+    start = time.time()
+    results = run_cases(cases, nodes, env,
+                        sorted(os.sched_getaffinity(0)))
+    print('ran {} cases in {:.0f}s'.format(len(cases), time.time() - start))
+    path = write_results(results_dir, args.machine, commit_hash, commit_date,
+                         env_name, benchmarks, cases, results)
+    print('results written to {}'.format(path))
+
+    if args.check_serial:
+        mismatches = check_serial(cases, results, nodes, env,
+                                  args.check_serial, args.tolerance)
+        if mismatches:
+            print('{} cases differ from their serial timings by more than '
+                  '{:.0%}'.format(len(mismatches), args.tolerance))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,11 @@ import matplotlib.cm as cmx
 
 from sum_up_results import create_benchmark_dataframe
 
+# index levels of create_benchmark_dataframe results that are not benchmark
+# parameters
+METADATA_LEVELS = ['type', 'name', 'class', 'file', 'version', 'machine',
+                   'fingerprint', 'commit_hash', 'date']
+
 
 def plot_results(df,
                  title=None,
@@ -132,8 +137,108 @@ def plot_results(df,
         return f
 
 
+def plot_efficiency(df,
+                    title=None,
+                    hue_labels=('backend', 'pickler'),
+                    col_label='name',
+                    fig_label='scaling',
+                    save=False,
+                    path=None):
+    """plot speedup and parallel efficiency curves as a function of n_jobs
+
+    df is a DataFrame output by create_benchmark_dataframe with
+    scaling_metrics=True. There is one column of subplots per col_label
+    value, the first row showing the speedup and the second one the parallel
+    efficiency. Each hue_labels combination is drawn as a separate curve, and
+    its fitted serial fraction is shown in the legend.
+    """
+    if save and (path is None):
+        raise ValueError("must provide a valid path to save the figures")
+
+    if fig_label is not None:
+        for n, g in df.groupby(level=fig_label):
+            _title = "{} ({}: {})".format(title, fig_label, n)
+            if path is not None:
+                filename, ext = os.path.splitext(path)
+                _path = "{}_{}{}".format(filename, n, ext)
+            else:
+                _path = None
+            plot_efficiency(g, _title, hue_labels, col_label, fig_label=None,
+                            save=save, path=_path)
+        return
+
+    df = df.reset_index().replace("", "pickle")
+    df['n_jobs'] = df['n_jobs'].astype(int)
+    hue_labels = list(hue_labels)
+    cols = np.sort(df[col_label].unique())
+
+    f, axs = plt.subplots(
+        nrows=2,
+        ncols=len(cols),
+        squeeze=False,
+        figsize=(6 * len(cols), 8),
+        sharex=True,
+        sharey='row')
+    f.suptitle(title)
+
+    max_n_jobs = df['n_jobs'].max()
+    for col_no, col in enumerate(cols):
+        g = df[df[col_label] == col]
+        speedup_ax, efficiency_ax = axs[:, col_no]
+        speedup_ax.set_title('{}: {}'.format(col_label, col))
+        speedup_ax.plot([1, max_n_jobs], [1, max_n_jobs], 'k--', alpha=0.3)
+        efficiency_ax.axhline(1, color='k', linestyle='--', alpha=0.3)
+
+        for hue, subgroup in g.groupby(hue_labels):
+            by_n_jobs = subgroup.groupby('n_jobs').mean(numeric_only=True)
+            label = '{} (serial fraction: {:.3f})'.format(
+                ', '.join(map(str, np.atleast_1d(hue))),
+                by_n_jobs['serial_fraction'].mean())
+            speedup_ax.plot(by_n_jobs.index, by_n_jobs['speedup'],
+                            marker='o', label=label)
+            efficiency_ax.plot(by_n_jobs.index, by_n_jobs['efficiency'],
+                               marker='o', label=label)
+
+        speedup_ax.set_ylabel('speedup')
+        efficiency_ax.set_ylabel('parallel efficiency')
+        efficiency_ax.set_xlabel('n_jobs')
+        efficiency_ax.set_ylim(bottom=0)
+        speedup_ax.legend(fontsize='small')
+
+    if save:
+        f.savefig(path)
+        plt.close(f)
+    else:
+        return f
+
+
+def default_labels(df):
+    """plot_results labels of a benchmark class without predefined ones
+
+    Timings are plotted against n_jobs (or the first parameter), one row per
+    benchmark method, and the backend and pickler parameters, when the class
+    has them, as columns and hues.
+    """
+    params = [n for n in df.index.names if n not in METADATA_LEVELS]
+    x_label = 'n_jobs' if 'n_jobs' in params else (
+        params[0] if params else 'commit_hash')
+    return dict(
+        y_label='time',
+        x_label=x_label,
+        hue_label='pickler' if 'pickler' in params else 'type',
+        col_label='backend' if 'backend' in params else 'file',
+        row_label='name')
+
+
 if __name__ == "__main__":
+    scaling_df = create_benchmark_dataframe(
+        group_by='class', scaling_metrics=True).pop('ScalingBench', None)
+    if scaling_df is not None:
+        plot_efficiency(scaling_df, title='ScalingBench',
+                        path='plots/ScalingBench.png', save=True)
+
     all_dfs = create_benchmark_dataframe(group_by='class')
+    all_dfs.pop('ScalingBench', None)
     labels = {
         'MakeRegressionDataBench':
         dict(
@@ -165,23 +270,29 @@ if __name__ == "__main__":
             row_label='name',
             fig_label='estimator_name'),
     }
+    labels['ClassificationBench'] = labels['RegressionBench']
+    labels['TransformerBench'] = labels['RegressionBench']
 
     # all_dfs['MakeRegressionDataBench'] =
     # all_dfs['MakeRegressionDataBench'].xs( '10000', axis=0,
     # level='n_samples', drop_level=False)
 
     # subset only few combinations of pickler+backend
-    all_dfs['RegressionBench'] = pd.concat(
-        [all_dfs['RegressionBench'].xs(
-             ("cloudpickle", "loky"), level=["pickler", "backend"],
-             drop_level=False),
-         all_dfs["RegressionBench"].xs(
-             ("pickle", "threading"), level=['pickler', 'backend'],
-             drop_level=False)],
-        axis=0)
+    for name in ['RegressionBench', 'ClassificationBench', 'TransformerBench']:
+        if name not in all_dfs:
+            continue
+        all_dfs[name] = pd.concat(
+            [all_dfs[name].xs(
+                 ("cloudpickle", "loky"), level=["pickler", "backend"],
+                 drop_level=False),
+             all_dfs[name].xs(
+                 ("pickle", "threading"), level=['pickler', 'backend'],
+                 drop_level=False)],
+            axis=0)
 
     for benchmark_name, benchmark_df in all_dfs.items():
         path = 'plots/{}.png'.format(benchmark_name)
         f = plot_results(
-            benchmark_df, title=benchmark_name, **labels[benchmark_name],
+            benchmark_df, title=benchmark_name,
+            **labels.get(benchmark_name, default_labels(benchmark_df)),
             path=path, save=True)
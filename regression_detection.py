@@ -0,0 +1,206 @@
+"""Statistical detection of performance regressions in the benchmark history
+
+For each machine, asv environment, benchmark and combination of its
+parameters (estimator, backend, pickler, n_jobs...), the history of results
+is ordered by commit date and segmented by binary segmentation on the log of
+the per-commit medians. Each change point is then tested with a Mann-Whitney
+U test between the samples of the segments before and after it, and its
+effect size is estimated with a bootstrap confidence interval of the ratio of
+the medians. Significant slowdowns are ranked by effect size.
+
+Several samples per commit are available when asv runs with
+SKLEARN_BENCHMARKS_REPEAT > 1 and --record-samples; otherwise each commit
+contributes its single result to the samples of its segment.
+
+Usage: python regression_detection.py [--alpha 0.01] [--min-effect 0.05]
+"""
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from sum_up_results import load_benchmark_results
+
+
+def bootstrap_ratio_ci(before, after, confidence=0.95, n_bootstrap=1000,
+                       random_state=0):
+    """bootstrap confidence interval of median(after) / median(before)"""
+    rng = np.random.RandomState(random_state)
+    before, after = np.asarray(before), np.asarray(after)
+    ratios = (
+        np.median(after[rng.randint(len(after),
+                                    size=(n_bootstrap, len(after)))], axis=1)
+        / np.median(before[rng.randint(len(before),
+                                       size=(n_bootstrap, len(before)))],
+                    axis=1))
+    alpha = (1 - confidence) / 2
+    return tuple(np.percentile(ratios, [100 * alpha, 100 * (1 - alpha)]))
+
+
+def mann_whitney(before, after):
+    """p-value of the one-sided test that after is larger than before"""
+    from scipy.stats import mannwhitneyu
+    if len(before) < 2 or len(after) < 2:
+        return np.nan
+    return mannwhitneyu(after, before, alternative='greater').pvalue
+
+
+def compare_commits(df, commit_a, commit_b, confidence=0.95):
+    """compare the samples of every benchmark between two commits
+
+    df is a long-format DataFrame as returned by load_benchmark_results.
+    Returns, for each benchmark and parameter combination present in both
+    commits, the ratio of the medians of commit_b over commit_a, its
+    bootstrap confidence interval and the Mann-Whitney p-value of commit_b
+    being slower.
+    """
+    rows = []
+    for key, g in _iter_histories(df):
+        a = _samples(g[g['commit_hash'].str.startswith(commit_a)])
+        b = _samples(g[g['commit_hash'].str.startswith(commit_b)])
+        if len(a) == 0 or len(b) == 0:
+            continue
+        low, high = bootstrap_ratio_ci(a, b, confidence=confidence)
+        rows.append(dict(key, ratio=np.median(b) / np.median(a),
+                         ratio_low=low, ratio_high=high,
+                         p_value=mann_whitney(a, b)))
+    return pd.DataFrame(rows)
+
+
+def _samples(g):
+    # all the samples of the rows of g, falling back to their result
+    samples = []
+    for result, row_samples in zip(g['result'], g['samples']):
+        if row_samples is not None and len(row_samples) > 0:
+            samples.extend(s for s in row_samples if s is not None)
+        elif not np.isnan(result):
+            samples.append(result)
+    return np.array(samples, dtype=float)
+
+
+def _iter_histories(df):
+    # yield (key, history) for each machine, environment, benchmark and
+    # parameter combination, history being sorted by commit date. The asv
+    # environments (python and dependency versions) are kept apart, as their
+    # results differ without any change of the benchmarked code
+    for (machine, env_name, benchmark), g in df.groupby(
+            ['machine', 'env_name', 'benchmark']):
+        param_names = json.loads(g['param_names'].iloc[0])
+        if not param_names:
+            groups = [((), g)]
+        else:
+            groups = g.groupby(param_names)
+        for params, history in groups:
+            key = dict(machine=machine, env_name=env_name,
+                       benchmark=benchmark)
+            key.update(zip(param_names, np.atleast_1d(params)))
+            yield key, history.sort_values('date')
+
+
+def binary_segmentation(values, penalty=None, min_size=2):
+    """change points of the mean of values, by binary segmentation
+
+    A segment is split at the point minimizing the sum of squared deviations
+    to the means of both sides, if this decreases the cost by more than
+    penalty. The default penalty is a BIC-like 2 * sigma^2 * log(n), with the
+    noise level sigma estimated from the median absolute difference of
+    consecutive values. Returns the sorted indices at which new segments
+    start.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if penalty is None:
+        sigma = np.median(np.abs(np.diff(values))) / (0.6745 * np.sqrt(2)) \
+            if n > 1 else 0
+        penalty = 2 * max(sigma, 1e-12) ** 2 * np.log(max(n, 2))
+
+    def cost(segment):
+        return np.sum((segment - segment.mean()) ** 2)
+
+    change_points = []
+    segments = [(0, n)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2 * min_size:
+            continue
+        segment = values[start:end]
+        total_cost = cost(segment)
+        best_gain, best_split = 0, None
+        for split in range(min_size, end - start - min_size + 1):
+            gain = total_cost - cost(segment[:split]) - cost(segment[split:])
+            if gain > best_gain:
+                best_gain, best_split = gain, split
+        if best_split is not None and best_gain > penalty:
+            change_points.append(start + best_split)
+            segments.extend([(start, start + best_split),
+                             (start + best_split, end)])
+    return sorted(change_points)
+
+
+def detect_regressions(df, alpha=0.01, min_effect=0.05, min_size=2,
+                       types=('time',)):
+    """rank the significant slowdowns of the benchmark history
+
+    Returns a DataFrame with one row per change point where the median of
+    the results increased by more than min_effect (relative) with a
+    Mann-Whitney p-value below alpha, sorted by decreasing lower bound of
+    the bootstrap confidence interval of the slowdown ratio.
+    """
+    df = df[df['type'].isin(types)]
+    rows = []
+    for key, history in _iter_histories(df):
+        commits = history.groupby('commit_hash', sort=False)
+        commit_hashes = list(commits.groups)
+        per_commit = [_samples(commits.get_group(c)) for c in commit_hashes]
+        valid = [i for i, s in enumerate(per_commit) if len(s) > 0]
+        if len(valid) < 2 * min_size:
+            continue
+        log_medians = [np.log(np.median(per_commit[i])) for i in valid]
+
+        boundaries = [0] + binary_segmentation(log_medians,
+                                               min_size=min_size)
+        boundaries.append(len(valid))
+        for i in range(1, len(boundaries) - 1):
+            before = np.concatenate(
+                [per_commit[valid[j]]
+                 for j in range(boundaries[i - 1], boundaries[i])])
+            after = np.concatenate(
+                [per_commit[valid[j]]
+                 for j in range(boundaries[i], boundaries[i + 1])])
+            ratio = np.median(after) / np.median(before)
+            p_value = mann_whitney(before, after)
+            if ratio < 1 + min_effect or not p_value < alpha:
+                continue
+            low, high = bootstrap_ratio_ci(before, after)
+            rows.append(dict(
+                key, commit_hash=commit_hashes[valid[boundaries[i]]],
+                previous_commit_hash=commit_hashes[valid[boundaries[i] - 1]],
+                ratio=ratio, ratio_low=low, ratio_high=high,
+                p_value=p_value))
+
+    result = pd.DataFrame(rows)
+    if len(result) > 0:
+        result = result.sort_values(['ratio_low', 'ratio'],
+                                    ascending=False).reset_index(drop=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--alpha', type=float, default=0.01)
+    parser.add_argument('--min-effect', type=float, default=0.05,
+                        help='minimum relative slowdown to report')
+    parser.add_argument('--machine', nargs='+', default=None)
+    parser.add_argument('--class', dest='classes', nargs='+', default=None)
+    args = parser.parse_args()
+
+    df = load_benchmark_results(machines=args.machine, classes=args.classes)
+    regressions = detect_regressions(df, alpha=args.alpha,
+                                     min_effect=args.min_effect)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(regressions)
+
+
+if __name__ == "__main__":
+    main()
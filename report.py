@@ -0,0 +1,369 @@
+"""Generate a static HTML dashboard of the benchmark results
+
+For each benchmark, the results of the last commit run on each machine are
+laid out from the benchmark parameters: n_jobs (or the first varying
+parameter) is the x axis, and every other parameter a facet, with one figure
+per combination of values. Each figure shows one series per machine, and per
+commit and environment when several of them are selected. The dashboard can
+be filtered by the value of any facet (backend, pickler, estimator...), and
+for time_* benchmarks with an n_jobs parameter switched to the speedup
+relative to the smallest n_jobs.
+
+Figures are SVG files named after a hash of the data they show and of the
+renderer: only the figures whose results changed since the last generation
+are rendered again, and the ones no longer shown are removed.
+
+Usage: python report.py [--output report] [--machine ...] [--commit ...]
+"""
+import argparse
+import hashlib
+import html
+import inspect
+import json
+import os
+
+import pandas as pd
+
+from sum_up_results import load_benchmark_results
+
+X_PARAM = 'n_jobs'
+
+# tab10 colormap
+COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b',
+          '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
+
+WIDTH, HEIGHT = 360, 240
+MARGIN_LEFT, MARGIN_RIGHT, MARGIN_TOP, MARGIN_BOTTOM = 60, 10, 30, 40
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; margin: 1em; }}
+.filters {{ position: sticky; top: 0; background: white; padding: 0.5em 0;
+            border-bottom: 1px solid #ccc; }}
+.filters label {{ margin-right: 1em; }}
+.figure {{ display: inline-block; vertical-align: top; margin: 0.5em;
+           font-size: small; }}
+body.speedup .figure img.time, body.time .figure img.speedup {{
+    display: none; }}
+</style>
+</head>
+<body class="time">
+<h1>{title}</h1>
+<div class="filters">
+<label><input type="radio" name="view" value="time" checked> results</label>
+<label><input type="radio" name="view" value="speedup"> speedup</label>
+{filters}
+</div>
+{sections}
+<script>
+function update() {{
+  var view = document.querySelector('input[name=view]:checked').value;
+  document.body.className = view;
+  var selects = document.querySelectorAll('select.filter');
+  document.querySelectorAll('section').forEach(function (section) {{
+    var n_visible = 0;
+    section.querySelectorAll('.figure').forEach(function (figure) {{
+      var visible = view === 'time' || figure.querySelector('img.speedup');
+      selects.forEach(function (select) {{
+        var value = figure.getAttribute('data-' + select.name);
+        if (select.value && value !== null && value !== select.value) {{
+          visible = false;
+        }}
+      }});
+      figure.style.display = visible ? '' : 'none';
+      n_visible += visible ? 1 : 0;
+    }});
+    section.style.display = n_visible ? '' : 'none';
+  }});
+}}
+document.querySelectorAll('select.filter, input[name=view]').forEach(
+  function (input) {{ input.addEventListener('change', update); }});
+update();
+</script>
+</body>
+</html>
+"""
+
+
+def _sort_key(value):
+    # sort numerical parameter values numerically
+    try:
+        return (0, float(value), '')
+    except (TypeError, ValueError):
+        return (1, 0., str(value))
+
+
+def facet_layout(param_names, df):
+    """split the parameters of a benchmark into x axis and facets"""
+    if X_PARAM in param_names:
+        x = X_PARAM
+    else:
+        varying = [p for p in param_names if df[p].nunique() > 1]
+        x = varying[0] if varying else None
+    return x, [p for p in param_names if p != x]
+
+
+def last_commit_results(df):
+    """keep the results of the last commit run on each machine"""
+    last_date = df.groupby(['machine', 'benchmark'])['date'].transform('max')
+    return df[df['date'] == last_date]
+
+
+def render_bar_chart(title, categories, series, y_label, ideal=None):
+    """render grouped bars as an SVG document
+
+    series maps the name of each series to its values, one per category.
+    ideal, if given, is a list of values drawn as a dashed reference line.
+    """
+    plot_width = WIDTH - MARGIN_LEFT - MARGIN_RIGHT
+    plot_height = HEIGHT - MARGIN_TOP - MARGIN_BOTTOM
+    values = [v for vs in series.values() for v in vs if v == v]
+    values += [v for v in ideal or [] if v == v]
+    y_max = max(values, default=1.) * 1.1 or 1.
+
+    def y(value):
+        return MARGIN_TOP + plot_height * (1 - value / y_max)
+
+    group_width = plot_width / max(len(categories), 1)
+    bar_width = 0.8 * group_width / max(len(series), 1)
+    elements = [
+        '<text x="{}" y="15" text-anchor="middle" font-size="12">{}</text>'
+        .format(WIDTH / 2, html.escape(title)),
+        '<text x="12" y="{}" font-size="11" text-anchor="middle" '
+        'transform="rotate(-90 12 {})">{}</text>'.format(
+            MARGIN_TOP + plot_height / 2, MARGIN_TOP + plot_height / 2,
+            html.escape(y_label)),
+        '<line x1="{0}" y1="{1}" x2="{0}" y2="{2}" stroke="black"/>'.format(
+            MARGIN_LEFT, MARGIN_TOP, MARGIN_TOP + plot_height),
+        '<line x1="{0}" y1="{1}" x2="{2}" y2="{1}" stroke="black"/>'.format(
+            MARGIN_LEFT, MARGIN_TOP + plot_height, WIDTH - MARGIN_RIGHT)]
+    for tick in [0, 0.5, 1]:
+        value = tick * y_max / 1.1
+        elements.append(
+            '<text x="{}" y="{}" font-size="10" text-anchor="end">{:.3g}'
+            '</text>'.format(MARGIN_LEFT - 4, y(value) + 3, value))
+
+    for i, category in enumerate(categories):
+        x0 = MARGIN_LEFT + i * group_width + 0.1 * group_width
+        elements.append(
+            '<text x="{}" y="{}" font-size="10" text-anchor="middle">{}'
+            '</text>'.format(MARGIN_LEFT + (i + 0.5) * group_width,
+                             MARGIN_TOP + plot_height + 14,
+                             html.escape(str(category))))
+        for j, values in enumerate(series.values()):
+            value = values[i]
+            if value != value:
+                continue
+            elements.append(
+                '<rect x="{:.1f}" y="{:.1f}" width="{:.1f}" height="{:.1f}" '
+                'fill="{}" fill-opacity="0.7"><title>{:.4g}</title></rect>'
+                .format(x0 + j * bar_width, y(value), bar_width,
+                        MARGIN_TOP + plot_height - y(value),
+                        COLORS[j % len(COLORS)], value))
+    if ideal is not None:
+        points = ' '.join('{:.1f},{:.1f}'.format(
+            MARGIN_LEFT + (i + 0.5) * group_width, y(value))
+            for i, value in enumerate(ideal))
+        elements.append('<polyline points="{}" fill="none" stroke="black" '
+                        'stroke-dasharray="4 3"/>'.format(points))
+
+    # legend
+    for j, name in enumerate(series):
+        x0 = MARGIN_LEFT + 4 + 100 * j
+        elements.append(
+            '<rect x="{}" y="{}" width="8" height="8" fill="{}"/>'
+            '<text x="{}" y="{}" font-size="10">{}</text>'.format(
+                x0, HEIGHT - 12, COLORS[j % len(COLORS)], x0 + 11,
+                HEIGHT - 4, html.escape(str(name))))
+
+    return ('<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}">'
+            '{}</svg>'.format(WIDTH, HEIGHT, ''.join(elements)))
+
+
+def series_keys(df):
+    """columns identifying the series: the machine, and the commit and the
+    environment when results of several of them are shown"""
+    return ['machine'] + [key for key in ['commit_hash', 'env_name']
+                          if df[key].nunique() > 1]
+
+
+def _series_names(g, keys):
+    names = g['machine'].astype(str)
+    for key in keys[1:]:
+        values = g[key].astype(str)
+        if key == 'commit_hash':
+            values = values.str[:8]
+        names = names + ' ' + values
+    return names
+
+
+def _figure_series(g, x, keys):
+    # mean result for each x value and series, as categories and series
+    x_values = g[x] if x is not None else pd.Series('', index=g.index)
+    table = g['result'].groupby([x_values.values,
+                                 _series_names(g, keys).values]
+                                ).mean().unstack()
+    categories = sorted(table.index, key=_sort_key)
+    table = table.loc[categories]
+    series = {name: [float(v) for v in table[name]]
+              for name in sorted(table.columns, key=_sort_key)}
+    return categories, series
+
+
+def iter_figures(df, units):
+    """yield the figures of the dashboard, grouped by benchmark
+
+    Each figure is a dict holding the benchmark, its facet values and the
+    SVG documents of its views.
+    """
+    keys = series_keys(df)
+    for benchmark, g in df.groupby('benchmark', sort=True):
+        param_names = json.loads(g['param_names'].iloc[0])
+        x, facets = facet_layout(param_names, g)
+        kind = g['type'].iloc[0]
+        y_label = 'time (s)' if kind == 'time' else units.get(benchmark, '')
+
+        groups = g.groupby(facets, sort=True) if facets else [((), g)]
+        for facet_values, fg in groups:
+            if not isinstance(facet_values, tuple):
+                facet_values = (facet_values,)
+            facet_values = dict(zip(facets, map(str, facet_values)))
+            title = ', '.join('{}={}'.format(k, v)
+                              for k, v in facet_values.items()
+                              if g[k].nunique() > 1)
+            categories, series = _figure_series(fg, x, keys)
+            views = {'time': (title, categories, series, y_label, None)}
+
+            if kind == 'time' and x == X_PARAM and len(categories) > 1:
+                n_jobs = [float(c) for c in categories]
+                speedup = {name: [values[0] / v for v in values]
+                           for name, values in series.items()}
+                views['speedup'] = (
+                    title, categories, speedup,
+                    'speedup vs n_jobs={}'.format(categories[0]),
+                    [n / n_jobs[0] for n in n_jobs])
+            yield dict(benchmark=benchmark, facets=facet_values,
+                       views=views, x=x)
+
+
+# version of the rendering, part of the name of the figures so that changes
+# to render_bar_chart or to its constants render them again
+RENDERER_VERSION = hashlib.sha1(repr((
+    inspect.getsource(render_bar_chart), COLORS, WIDTH, HEIGHT, MARGIN_LEFT,
+    MARGIN_RIGHT, MARGIN_TOP, MARGIN_BOTTOM)).encode()).hexdigest()[:12]
+
+
+def _figure_path(figure_dir, view):
+    key = hashlib.sha1(json.dumps([RENDERER_VERSION, view], sort_keys=True,
+                                  default=str).encode()).hexdigest()
+    return os.path.join(figure_dir, key + '.svg')
+
+
+def generate_report(df, output_dir, units=None, title='Benchmark results'):
+    """write the dashboard of df to output_dir/index.html
+
+    Returns the number of figures rendered and the number of figures reused
+    from a previous generation.
+    """
+    figure_dir = os.path.join(output_dir, 'figures')
+    os.makedirs(figure_dir, exist_ok=True)
+    units = units or {}
+
+    sections = {}
+    filter_values = {}
+    used = set()
+    n_rendered = n_reused = 0
+    for figure in iter_figures(df, units):
+        images = []
+        for view_name, view in sorted(figure['views'].items()):
+            path = _figure_path(figure_dir, view)
+            used.add(os.path.basename(path))
+            if os.path.exists(path):
+                n_reused += 1
+            else:
+                with open(path + '.tmp', 'w') as f:
+                    f.write(render_bar_chart(*view))
+                os.replace(path + '.tmp', path)
+                n_rendered += 1
+            images.append('<img class="{}" loading="lazy" src="figures/{}">'
+                          .format(view_name, os.path.basename(path)))
+        attributes = ' '.join('data-{}="{}"'.format(
+            html.escape(k), html.escape(v))
+            for k, v in figure['facets'].items())
+        sections.setdefault(figure['benchmark'], []).append(
+            '<div class="figure" {}>{}</div>'.format(attributes,
+                                                     ''.join(images)))
+        for k, v in figure['facets'].items():
+            filter_values.setdefault(k, set()).add(v)
+
+    # remove the figures of results that are not shown anymore
+    for filename in os.listdir(figure_dir):
+        if filename.endswith('.svg') and filename not in used:
+            os.remove(os.path.join(figure_dir, filename))
+
+    filters = []
+    for name in sorted(filter_values, key=lambda n: (
+            n not in ('backend', 'pickler'), n)):
+        values = sorted(filter_values[name], key=_sort_key)
+        if len(values) < 2:
+            continue
+        options = ''.join('<option value="{0}">{0}</option>'.format(
+            html.escape(v)) for v in values)
+        filters.append('<label>{0} <select class="filter" name="{0}">'
+                       '<option value="">all</option>{1}</select></label>'
+                       .format(html.escape(name), options))
+    sections_html = '\n'.join(
+        '<section><h2>{}</h2>\n{}</section>'.format(
+            html.escape(benchmark), '\n'.join(figures))
+        for benchmark, figures in sorted(sections.items()))
+
+    with open(os.path.join(output_dir, 'index.html'), 'w') as f:
+        f.write(PAGE_TEMPLATE.format(title=html.escape(title),
+                                     filters='\n'.join(filters),
+                                     sections=sections_html))
+    return n_rendered, n_reused
+
+
+def load_units(results_dir):
+    """unit of each benchmark, from asv's benchmarks.json"""
+    path = os.path.join(results_dir, 'benchmarks.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        metadata = json.load(f)
+    return {name: benchmark.get('unit', '')
+            for name, benchmark in metadata.items()
+            if isinstance(benchmark, dict)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', default='report')
+    parser.add_argument('--machine', nargs='+', default=None)
+    parser.add_argument('--commit', nargs='+', default=None,
+                        help='commits to show instead of the last one of '
+                        'each machine')
+    parser.add_argument('--classes', nargs='+', default=None)
+    args = parser.parse_args()
+
+    from asv.config import Config
+    config = Config.load(os.path.join(os.path.dirname(
+        os.path.abspath(__file__)), 'asv.conf.json'))
+
+    df = load_benchmark_results(machines=args.machine,
+                                commit_hashes=args.commit,
+                                classes=args.classes)
+    if args.commit is None:
+        df = last_commit_results(df)
+    n_rendered, n_reused = generate_report(
+        df, args.output, units=load_units(config.results_dir))
+    print('{} figures rendered, {} reused, see {}'.format(
+        n_rendered, n_reused, os.path.join(args.output, 'index.html')))
+
+
+if __name__ == "__main__":
+    main()
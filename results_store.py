@@ -0,0 +1,194 @@
+"""Columnar store of asv results
+
+asv writes one JSON file per (machine, commit, environment). ingest_results
+converts the files that are new or changed since the last ingestion into
+Parquet files, one per asv result file, laid out as
+
+    <store_dir>/machine=<machine>/commit_hash=<commit_hash>/<env>.parquet
+
+Each row holds one result of one benchmark for one combination of its
+parameters, with one explicit column per parameter, and the individual
+samples of the result when asv recorded them. load_results then only
+scans the partitions and columns it is asked for.
+"""
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+INGESTED_INDEX = '_ingested.json'
+
+METADATA_COLUMNS = ['machine', 'commit_hash', 'date', 'env_name', 'version',
+                    'benchmark', 'type', 'file', 'class', 'name',
+                    'param_names']
+
+
+def _unquote(param_value):
+    # asv stores the repr of parameter values
+    return param_value.replace("'", "")
+
+
+def _iter_benchmark_results(result):
+    # yield (benchmark name, values, params, samples) from an asv result file,
+    # written either in the format of asv < 0.5 or in the columnar format of
+    # later versions. samples are only present if asv was run with
+    # --record-samples
+    columns = result.get('result_columns')
+    for benchmark, entry in result['results'].items():
+        if columns is not None:
+            entry = dict(zip(columns, entry))
+        elif not isinstance(entry, dict):
+            entry = {'result': entry, 'params': []}
+        values = entry.get('result')
+        params = entry.get('params') or []
+        samples = entry.get('samples')
+        if not isinstance(values, list):
+            values = [values]
+            samples = [samples]
+        if samples is None:
+            samples = [None] * len(values)
+        yield benchmark, values, params, samples
+
+
+def read_asv_result(path, benchmarks_metadata, machine):
+    """convert an asv result file into a DataFrame with one row per result"""
+    with open(path) as f:
+        result = json.load(f)
+
+    rows = []
+    for benchmark, values, params, samples in _iter_benchmark_results(
+            result):
+        if benchmark not in benchmarks_metadata:
+            # the benchmark was removed from the suite since
+            continue
+        metadata = benchmarks_metadata[benchmark]
+        param_names = metadata.get('param_names', [])
+        filename, classname, benchname = benchmark.rsplit('.', 2)[-3:]
+
+        base_row = {
+            'machine': machine,
+            'commit_hash': result['commit_hash'],
+            'date': result.get('date'),
+            'env_name': result.get('env_name'),
+            'version': result.get('params', {}).get('python'),
+            'benchmark': benchmark,
+            'type': metadata['type'],
+            'file': filename,
+            'class': classname,
+            'name': benchname,
+            'param_names': json.dumps(param_names)}
+
+        # asv runs the parameter combinations in the order of their
+        # cartesian product, and stores the results in that order
+        combinations = itertools.product(*params)
+        for combination, value, value_samples in zip(combinations, values,
+                                                     samples):
+            row = dict(base_row)
+            row.update(zip(param_names, map(_unquote, combination)))
+            row['result'] = np.nan if value is None else float(value)
+            row['samples'] = value_samples
+            rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def _partition_dir(store_dir, machine, commit_hash):
+    return os.path.join(store_dir, 'machine={}'.format(machine),
+                        'commit_hash={}'.format(commit_hash))
+
+
+def ingest_results(results_dir, store_dir):
+    """convert the new or modified asv result files into Parquet files
+
+    Returns the paths of the written Parquet files.
+    """
+    index_path = os.path.join(store_dir, INGESTED_INDEX)
+    ingested = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            ingested = json.load(f)
+
+    with open(os.path.join(results_dir, 'benchmarks.json')) as f:
+        benchmarks_metadata = json.load(f)
+
+    written = []
+    for machine in sorted(os.listdir(results_dir)):
+        machine_dir = os.path.join(results_dir, machine)
+        if not os.path.isdir(machine_dir):
+            continue
+        for filename in sorted(os.listdir(machine_dir)):
+            if not filename.endswith('.json') or filename == 'machine.json':
+                continue
+            path = os.path.join(machine_dir, filename)
+            key = os.path.join(machine, filename)
+            mtime = os.path.getmtime(path)
+            if ingested.get(key) == mtime:
+                continue
+
+            df = read_asv_result(path, benchmarks_metadata, machine)
+            if len(df) == 0:
+                ingested[key] = mtime
+                continue
+            partition_dir = _partition_dir(store_dir, machine,
+                                           df['commit_hash'].iloc[0])
+            os.makedirs(partition_dir, exist_ok=True)
+            part_path = os.path.join(
+                partition_dir, os.path.splitext(filename)[0] + '.parquet')
+            tmp_path = part_path + '.tmp'
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, part_path)
+            written.append(part_path)
+            ingested[key] = mtime
+
+    os.makedirs(store_dir, exist_ok=True)
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump(ingested, f, indent=1, sort_keys=True)
+    os.replace(index_path + '.tmp', index_path)
+    return written
+
+
+def _list_partition_values(path, key):
+    prefix = '{}='.format(key)
+    if not os.path.isdir(path):
+        return []
+    return [name[len(prefix):] for name in sorted(os.listdir(path))
+            if name.startswith(prefix)]
+
+
+def load_results(store_dir, machines=None, commit_hashes=None, classes=None,
+                 types=None):
+    """load the results of the store as a DataFrame
+
+    Only the partitions of the given machines and commits are read, and rows
+    are filtered by benchmark class and type (time, track...) while scanning
+    the Parquet files. Parameter columns of benchmarks that do not have this
+    parameter are null.
+    """
+    filters = []
+    if classes is not None:
+        filters.append(('class', 'in', list(classes)))
+    if types is not None:
+        filters.append(('type', 'in', list(types)))
+
+    dfs = []
+    for machine in _list_partition_values(store_dir, 'machine'):
+        if machines is not None and machine not in machines:
+            continue
+        machine_dir = os.path.join(store_dir, 'machine={}'.format(machine))
+        for commit_hash in _list_partition_values(machine_dir, 'commit_hash'):
+            if commit_hashes is not None and not any(
+                    commit_hash.startswith(c) for c in commit_hashes):
+                continue
+            partition_dir = _partition_dir(store_dir, machine, commit_hash)
+            for filename in sorted(os.listdir(partition_dir)):
+                if not filename.endswith('.parquet'):
+                    continue
+                df = pd.read_parquet(os.path.join(partition_dir, filename),
+                                     filters=filters or None)
+                dfs.append(df)
+
+    if not dfs:
+        return pd.DataFrame(columns=METADATA_COLUMNS + ['result', 'samples'])
+    return pd.concat(dfs, ignore_index=True, sort=False)
@@ -1,39 +1,203 @@
 from collections import defaultdict
+import json
 import os
 import socket
 
 import numpy as np
 import pandas as pd
 
-from asv.benchmarks import Benchmarks
 from asv.config import Config
-from asv.commands.publish import Publish
+
+from benchmarks.config import FINGERPRINT_DIR
+from results_store import ingest_results, load_results
 
 HOME = os.environ.get('HOME')
 hostname = socket.gethostname()
 
+# directory of the columnar results store, see results_store.py
+RESULTS_STORE_DIR = os.environ.get(
+    'SKLEARN_BENCHMARKS_STORE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results_store'))
+
+
+def _fit_serial_fraction(n_jobs, speedup, weak):
+    # least-squares fit of the serial fraction f of the workload, using
+    # Amdahl's law (speedup = 1 / (f + (1 - f) / p)) for strong scaling and
+    # Gustafson's law (speedup = p - f * (p - 1)) for weak scaling
+    mask = n_jobs > 1
+    p, s = n_jobs[mask], speedup[mask]
+    if len(p) == 0:
+        return np.nan
+    if weak:
+        a, b = p - s, p - 1
+    else:
+        a, b = 1 / s - 1 / p, 1 - 1 / p
+    return float(np.clip(np.sum(a * b) / np.sum(b * b), 0, 1))
+
+
+def compute_scaling_metrics(results, n_jobs_level='n_jobs',
+                            scaling_level='scaling'):
+    """compute speedup, parallel efficiency and serial fraction of results
+
+    results is a Series of timings indexed by a MultiIndex containing an
+    n_jobs level. Timings are compared with the one obtained using the
+    smallest n_jobs value among timings sharing all the other index levels
+    (estimator, backend, pickler, commit...). If a scaling level is present,
+    its 'weak' values are treated as weak scaling results, where the problem
+    size grows with n_jobs: the speedup is then the scaled speedup.
+    """
+    df = results.dropna().to_frame('time')
+    other_levels = [l for l in df.index.names if l != n_jobs_level]
+
+    def _metrics(g):
+        g = g.copy()
+        n_jobs = g.index.get_level_values(n_jobs_level).astype(int).values
+        reference = np.argmin(n_jobs)
+        p = n_jobs / n_jobs[reference]
+        ratio = g['time'].values[reference] / g['time'].values
+
+        weak = (scaling_level in g.index.names and
+                g.index.get_level_values(scaling_level)[0] == 'weak')
+        if weak:
+            g['efficiency'] = ratio
+            g['speedup'] = p * ratio
+        else:
+            g['speedup'] = ratio
+            g['efficiency'] = ratio / p
+        g['serial_fraction'] = _fit_serial_fraction(
+            p, g['speedup'].values, weak)
+        return g
+
+    if not other_levels:
+        return _metrics(df)
+    return df.groupby(level=other_levels, group_keys=False).apply(_metrics)
 
-def _remove_quotes(params):
-    # params is a list of lists, each list contains the values of one parameter
-    unquoted_params_values = []
-    for param_values in params:
-        unquoted_param_values = []
-        for param_value in param_values:
-            unquoted_param_values.append(param_value.replace("'", ""))
-        unquoted_params_values.append(unquoted_param_values)
-    return unquoted_params_values
 
+def load_benchmark_results(machines=None, commit_hashes=None, classes=None):
+    """ingest the new asv results and load them as a long-format DataFrame
 
-def create_benchmark_dataframe(group_by='name'):
+    There is one row per result, see results_store.load_results.
+    """
     repo_dirname = os.path.dirname(__file__)
     config_path = os.path.join(repo_dirname, 'asv.conf.json')
     config = Config.load(config_path)
 
-    benchmarks = Benchmarks.load(config)
+    ingest_results(config.results_dir, RESULTS_STORE_DIR)
+    return load_results(RESULTS_STORE_DIR, machines=machines,
+                        commit_hashes=commit_hashes, classes=classes)
+
+
+def load_fingerprints(fingerprint_dir=FINGERPRINT_DIR):
+    """load the fingerprints recorded by CalibrationBench as a DataFrame
+
+    There is one row per machine, commit and environment, with the
+    fingerprint id and the measured memory bandwidth.
+    """
+    rows = []
+    machines = os.listdir(fingerprint_dir) if os.path.isdir(
+        fingerprint_dir) else []
+    for machine in sorted(machines):
+        machine_dir = os.path.join(fingerprint_dir, machine)
+        for filename in sorted(os.listdir(machine_dir)):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(machine_dir, filename)) as f:
+                fingerprint = json.load(f)
+            rows.append(dict(
+                machine=machine, commit_hash=fingerprint['commit_hash'],
+                env_name=fingerprint['env_name'],
+                fingerprint=fingerprint['id'],
+                memory_bandwidth=fingerprint.get('memory_bandwidth')))
+    return pd.DataFrame(rows, columns=['machine', 'commit_hash', 'env_name',
+                                       'fingerprint', 'memory_bandwidth'])
+
+
+def add_fingerprints(df, fingerprint_dir=FINGERPRINT_DIR):
+    """add the fingerprint of their run to the rows of df
+
+    Runs without a recorded fingerprint are identified by their machine.
+    """
+    fingerprints = load_fingerprints(fingerprint_dir)
+    df = df.merge(fingerprints[['machine', 'commit_hash', 'env_name',
+                                'fingerprint']],
+                  on=['machine', 'commit_hash', 'env_name'], how='left')
+    df['fingerprint'] = df['fingerprint'].fillna(df['machine'])
+    return df
+
+
+def normalize_results(df, calibration):
+    """divide the timings of df by the calibration kernel of their run
+
+    calibration holds the results of CalibrationBench. Timings of runs
+    without a calibration result become NaN; track_* results are left
+    untouched.
+    """
+    kernel = calibration[calibration['name'] == 'time_calibration_kernel']
+    kernel = kernel.groupby(['machine', 'commit_hash', 'env_name'])[
+        'result'].median().rename('_calibration')
+    df = df.join(kernel, on=['machine', 'commit_hash', 'env_name'])
+    is_time = df['type'] == 'time'
+    df.loc[is_time, 'result'] = (df.loc[is_time, 'result'] /
+                                 df.loc[is_time, '_calibration'])
+    return df.drop(columns='_calibration')
+
+
+def recommend_backends(threshold=0.5, machines=None, commit_hashes=None):
+    """choose between threads and processes for each profiled workload
+
+    The GIL-bound fraction of each workload (see with_gil_profiling) is the
+    median of its results with the threading backend and n_jobs > 1, for
+    each estimator of the per-estimator benchmarks. Workloads holding or
+    waiting for the GIL more than threshold of the time are assigned the loky
+    backend, the other ones the threading backend.
+    """
+    prefix = 'track_gil_bound_fraction_'
+    df = load_benchmark_results(machines=machines,
+                                commit_hashes=commit_hashes)
+    df = df[df['name'].str.startswith(prefix) &
+            (df['backend'] == 'threading')].dropna(subset=['result'])
+    df = df[df['n_jobs'].astype(int) > 1]
+    df = df.assign(workload=df['name'].str[len(prefix):])
+
+    keys = ['class', 'workload']
+    if 'estimator_name' in df.columns:
+        keys.append('estimator_name')
+    fractions = df.groupby(keys, dropna=False)['result'].median()
+    return pd.DataFrame({
+        'gil_bound_fraction': fractions,
+        'backend': np.where(fractions > threshold, 'loky', 'threading')},
+        index=fractions.index)
+
+
+def create_benchmark_dataframe(group_by='name', scaling_metrics=False,
+                               machines=None, commit_hashes=None,
+                               classes=None, normalize=False):
+    """load the asv results as pandas objects, grouped by group_by
+
+    New asv result files are first ingested into the columnar results store,
+    which is then scanned for the given machines, commits and benchmark
+    classes (all of them by default).
+
+    Results are Series of timings. If scaling_metrics is True, they are
+    DataFrames holding the timings along with the speedup, efficiency and
+    serial fraction computed by compute_scaling_metrics. The machine and the
+    hardware and software fingerprint of each run (see load_fingerprints)
+    are index levels, that can also be grouped by. If normalize is True,
+    timings are expressed in units of the calibration kernel timed in the
+    same run (see normalize_results).
+    """
+    df = load_benchmark_results(machines=machines,
+                                commit_hashes=commit_hashes, classes=classes)
+    df = add_fingerprints(df)
+    if normalize:
+        calibration = load_benchmark_results(
+            machines=machines, commit_hashes=commit_hashes,
+            classes=['CalibrationBench'])
+        df = normalize_results(df, calibration)
 
     results = defaultdict(dict)
     metadata_levels = ['type', 'name', 'class', 'file', 'version',
-                       'commit_hash', 'date']
+                       'machine', 'fingerprint', 'commit_hash', 'date']
 
     if isinstance(group_by, str):
         group_by = [group_by]
@@ -42,37 +206,26 @@ def create_benchmark_dataframe(group_by='name'):
     levels_to_concat_on = [l for l in metadata_levels if l not in
                            levels_to_group_by]
 
-    for single_env_result in Publish.iter_results(config, benchmarks):
-        benchmark_metadata = {
-            'version': single_env_result._params['python'],
-            'commit_hash': single_env_result._commit_hash,
-            'date': single_env_result._date}
-
-        for b_name, params in single_env_result._benchmark_params.items():
-            unquoted_params = _remove_quotes(params)
-            filename, classname, benchname = b_name.split('.')
-
-            _benchmark = benchmarks[b_name]
-            b_type, param_names = _benchmark['type'], _benchmark['param_names']
-
-            benchmark_metadata.update({
-                'type': b_type,
-                'file': filename,
-                'class': classname,
-                'name': benchname})
-
-            values_to_group_by = tuple([benchmark_metadata[key] for key in
-                                        levels_to_group_by])
-            values_to_concat_on = tuple([benchmark_metadata[key] for key in
-                                        levels_to_concat_on])
-
-            # this is dangerous because we there is no reason the results
-            # order follow the carthesian product of the parameter space,
-            # however empirically it seems to be the case
-            mi = pd.MultiIndex.from_product(unquoted_params, names=param_names)
-            _results = pd.Series(single_env_result._results[b_name], index=mi)
-
-            results[values_to_group_by][values_to_concat_on] = _results
+    for _, g in df.groupby(['benchmark', 'env_name'] + metadata_levels,
+                           sort=False, dropna=False):
+        benchmark_metadata = g.iloc[0]
+        values_to_group_by = tuple([benchmark_metadata[key] for key in
+                                    levels_to_group_by])
+        values_to_concat_on = tuple([benchmark_metadata[key] for key in
+                                    levels_to_concat_on])
+
+        param_names = json.loads(benchmark_metadata['param_names'])
+        mi = pd.MultiIndex.from_arrays([g[p].values for p in param_names],
+                                       names=param_names)
+        _results = pd.Series(g['result'].values, index=mi)
+
+        results[values_to_group_by][values_to_concat_on] = _results
+
+    if scaling_metrics:
+        for k, v in results.items():
+            for kk, _results in v.items():
+                if 'n_jobs' in _results.index.names:
+                    v[kk] = compute_scaling_metrics(_results)
 
     clean_result = {}
     for k, v in results.items():